@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Times the aggregation in create_agg_stats on the saved build state, repeated to a longer history.
+
+    python bench/aggregate.py [--scale N]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build_stats import RECENCY, load_build_state, write_json_array
+from stats import aggregate
+from stats.columns import PlanetColumns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=10, help="how many times to repeat the saved history")
+    args = parser.parse_args()
+
+    columns: PlanetColumns = load_build_state()['columns']
+    if len(columns) == 0:
+        sys.exit("No build state, run build_stats.py first")
+    scaled = columns.repeated(args.scale)
+
+    start = time.perf_counter()
+    active = set(aggregate.campaign_planets(scaled))
+    active_sum = aggregate.recent_player_sums(scaled, active, RECENCY)
+    reduced = time.perf_counter()
+    # The per snapshot history is built lazily while it is encoded
+    out = io.StringIO()
+    write_json_array(out, aggregate.rows(scaled, active))
+    encoded = out.getvalue()
+    done = time.perf_counter()
+
+    print(f"{len(scaled)} snapshots x {scaled.planet_count} planets, {len(active_sum)} tracked")
+    print(f"aggregate: {(reduced - start) * 1000:.1f} ms, history + encode: {(done - reduced) * 1000:.1f} ms, {len(encoded) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
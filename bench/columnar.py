@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Compares size and parse time of aggregates.json with the columnar JSON and binary encodings.
+
+    python bench/columnar.py [--scale N]
+
+Parse times in the browser are approximated with node when it is installed.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build_stats import load_build_state, write_json_array
+from stats import aggregate, columnar
+from stats.columns import PlanetColumns
+
+ROWS_FROM_BINARY = 'aggregates.bin + rows'
+
+# Times what docs/index.md does with each file. The binary file is decoded with the page's own functions from
+# docs/components/planet_history.js, loaded without its npm imports, which the decoding does not use.
+NODE_SCRIPT = '''
+const fs = require("fs");
+const [rowsPath, columnsPath, binaryPath, componentPath] = process.argv.slice(1);
+function time(fn) {
+    const start = process.hrtime.bigint();
+    fn();
+    return Number(process.hrtime.bigint() - start) / 1e6;
+}
+(async () => {
+    const component = fs.readFileSync(componentPath, "utf8").replace(/^import .* from "npm:.*";$/gm, "");
+    const {aggregateArrays, aggregateRows} = await import("data:text/javascript," + encodeURIComponent(component));
+    const rowsText = fs.readFileSync(rowsPath, "utf8");
+    const columnsText = fs.readFileSync(columnsPath, "utf8");
+    const binary = fs.readFileSync(binaryPath);
+    const buffer = binary.buffer.slice(binary.byteOffset, binary.byteOffset + binary.length);
+    console.log(JSON.stringify({
+        rows: time(() => JSON.parse(rowsText)),
+        columns: time(() => JSON.parse(columnsText)),
+        binary: time(() => aggregateArrays(buffer)),
+        binary_rows: time(() => aggregateRows(aggregateArrays(buffer))),
+    }));
+})();
+'''
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=10, help="how many times to repeat the saved history")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    columns: PlanetColumns = load_build_state()['columns']
+    if len(columns) == 0:
+        sys.exit("No build state, run build_stats.py first")
+    scaled = columns.repeated(args.scale)
+    active = set(aggregate.campaign_planets(scaled))
+
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = {name: os.path.join(tmp, name) for name in ('aggregates.json', 'aggregates_columns.json', 'aggregates.bin')}
+        with open(paths['aggregates.json'], 'w') as fh:
+            write_json_array(fh, aggregate.rows(scaled, active))
+        encoded = columnar.aggregate_arrays(scaled, active)
+        with open(paths['aggregates_columns.json'], 'w') as fh:
+            fh.write(json.dumps(columnar.to_json(encoded)))
+        with open(paths['aggregates.bin'], 'wb') as fh:
+            fh.write(columnar.to_binary(encoded))
+
+        contents = {}
+        for name, path in paths.items():
+            with open(path, 'rb') as fh:
+                contents[name] = fh.read()
+        parsers = {
+            'aggregates.json': json.loads,
+            'aggregates_columns.json': json.loads,
+            'aggregates.bin': columnar.from_binary,
+        }
+
+        node = {}
+        if shutil.which('node'):
+            component = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docs', 'components', 'planet_history.js')
+            result = subprocess.run(['node', '-e', NODE_SCRIPT, *paths.values(), component], capture_output=True, text=True, check=True)
+            node = dict(zip(list(paths) + [ROWS_FROM_BINARY], json.loads(result.stdout).values()))
+
+        print(f"{len(scaled)} snapshots, {len(encoded['planets'])} planets shown")
+        print(f"{'file':<26}{'bytes':>12}{'gzipped':>12}{'python ms':>12}{'node ms':>10}")
+        for name, data in contents.items():
+            parsed = best_of(args.repeat, lambda: parsers[name](data))
+            node_ms = f"{node[name]:.1f}" if name in node else '-'
+            print(f"{name:<26}{len(data):>12}{len(gzip.compress(data)):>12}{parsed:>12.1f}{node_ms:>10}")
+        if ROWS_FROM_BINARY in node:
+            # What the page pays, it turns the typed arrays back into aggregates.json rows for the charts
+            print(f"{ROWS_FROM_BINARY:<26}{'':>12}{'':>12}{'-':>12}{node[ROWS_FROM_BINARY]:>10.1f}")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Times v1_to_frontend on a recorded snapshot against the dump/validate conversion it replaced.
+
+    python bench/convert.py [snapshot.json] [--repeat N]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build_stats import v1_to_frontend, wrap_if_str
+from models import frontend, v1
+
+
+def dump_validate_to_frontend(v1_rec: v1.FullStatus) -> frontend.CurrentStatus:
+    """The conversion before v1_to_frontend built the frontend models directly, kept here as the baseline.
+    Every object is dumped to a dict and validated again, and the record is modified in place."""
+    planets = []
+    events = []
+
+    for planet in v1_rec.planets:
+        planet.name = wrap_if_str(planet.name)
+        planet.position.x *= 100
+        planet.position.y *= 100
+        planets.append(frontend.Planet.model_validate(planet.model_dump()))
+        if planet.event is not None:
+            events.append(frontend.Defense.model_validate({
+                'id': planet.event.id,
+                'faction': planet.event.faction,
+                'type': planet.event.event_type,
+                'start_time': int(planet.event.start_time.timestamp()*1000),
+                'end_time': int(planet.event.end_time.timestamp()*1000),
+                'health': planet.event.health,
+                'max_health': planet.event.max_health,
+                'joint_operation_ids': planet.event.joint_operation_ids,
+                'planet': planet.model_dump(),
+            }))
+
+    assignments = []
+    for assignment in v1_rec.assignments:
+        assignments.append(frontend.Assignment.model_validate({
+            'id': assignment.id,
+            'title': wrap_if_str(assignment.title),
+            'briefing': wrap_if_str(assignment.briefing),
+            'description': wrap_if_str(assignment.description),
+            'tasks': [task.model_dump() for task in assignment.tasks],
+            'reward': None if assignment.reward is None else assignment.reward.model_dump(),
+            'progress': assignment.progress,
+            'expiration': int(assignment.expiration.timestamp()*1000),
+        }))
+    war_details = frontend.WarDetails.model_validate({
+        'start_time': int(v1_rec.war.started.timestamp()*1000),
+        'end_time': int(v1_rec.war.ended.timestamp()*1000),
+        'now': int(v1_rec.war.now.timestamp()*1000),
+        'factions': v1_rec.war.factions,
+        'impact_multiplier': v1_rec.war.impact_multiplier,
+        'statistics': frontend.Statistics.model_validate(v1_rec.war.statistics.model_dump()),
+    })
+
+    campaigns = []
+    for campaign in v1_rec.campaigns:
+        campaign.planet.name = wrap_if_str(campaign.planet.name)
+        campaign.planet.position.x *= 100
+        campaign.planet.position.y *= 100
+        campaigns.append(frontend.Campaign.model_validate(campaign.model_dump()))
+
+    dispatches = []
+    for dispatch in v1_rec.dispatches:
+        if dispatch.message is None:
+            continue
+        dispatches.append(frontend.Dispatch.model_validate({
+            'id': dispatch.id,
+            'message': wrap_if_str(dispatch.message),
+            'title': wrap_if_str('Dispatch'),
+        }))
+
+    return frontend.CurrentStatus.model_validate({
+        'events': events,
+        'planets': planets,
+        'assignments': assignments,
+        'war': war_details,
+        'active': campaigns,
+        'dispatches': dispatches,
+        'snapshot_at': int(v1_rec.snapshot_at.timestamp()*1000),
+    })
+
+
+def validate(data, count, snapshot_at):
+    records = []
+    for _ in range(count):
+        record = v1.FullStatus.model_validate_json(data)
+        record.snapshot_at = snapshot_at
+        records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('snapshot', nargs='?', default='801_full_v1.json')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.snapshot, 'rb') as fh:
+        data = fh.read()
+    snapshot_at = datetime.datetime.now(datetime.timezone.utc)
+    expected, actual = validate(data, 2, snapshot_at)
+    if dump_validate_to_frontend(expected) != v1_to_frontend(actual):
+        sys.exit("v1_to_frontend and the dump/validate conversion disagree")
+
+    timings = {}
+    for name, convert in (('dump/validate', dump_validate_to_frontend), ('v1_to_frontend', v1_to_frontend)):
+        # Validate outside the timed loop, conversion is what we measure. The baseline modifies
+        # its input, so each conversion gets its own records
+        records = validate(data, args.repeat, snapshot_at)
+        start = time.perf_counter()
+        for record in records:
+            convert(record)
+        timings[name] = (time.perf_counter() - start) / args.repeat
+        print(f"{name}: {timings[name] * 1000:.2f} ms/snapshot over {args.repeat} snapshots")
+    print(f"speedup: {timings['dump/validate'] / timings['v1_to_frontend']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Times each stage of build_stats.py and writes the results as JSON so runs can be compared.
+
+    python bench/stages.py [--repo PATH] [--snapshot FILE] [--snapshots N] [--scale N] [--output FILE] [--compare FILE]
+
+Stages run on the history of --repo, on a recorded snapshot repeated --snapshots times,
+and on the saved build state repeated --scale times. create_agg_stats writes docs/data and _cache in --repo like a normal build.
+Throughput is measured without tracing, peak memory (as seen by tracemalloc) in a second run of the stage.
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import build_stats
+from models import projections, v1
+from stats import aggregate, columnar
+from stats.columns import PlanetColumns
+from stats.gitobjects import GitObjectReader, log_snapshots
+
+
+def measure(name, run, items, size, memory=True):
+    """Times `run()` processing `items` snapshots totalling `size` bytes, then reruns it traced for peak memory."""
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    result = {
+        'stage': name,
+        'snapshots': items,
+        'bytes': size,
+        'seconds': seconds,
+        'snapshots_per_s': items / seconds if seconds else None,
+        'mb_per_s': size / 1e6 / seconds if seconds else None,
+        'peak_bytes': None,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def git_stages(limit, memory):
+    snapshots = log_snapshots('801_full_v1.json', limit=limit)
+    if not snapshots:
+        print("No 801_full_v1.json history, skipping git stages", file=sys.stderr)
+        return []
+    sizes = []
+
+    def read():
+        sizes.clear()
+        with GitObjectReader() as reader:
+            for snapshot in snapshots:
+                _, data = reader.read_snapshot(snapshot, '801_full_v1.json')
+                sizes.append(len(data))
+
+    def enumerate_history():
+        log_snapshots('801_full_v1.json', limit=limit)
+
+    results = [measure('git-log', enumerate_history, len(snapshots), 0, memory)]
+    results.append(measure('git-read', read, len(snapshots), 0, memory))
+    results[-1]['bytes'] = sum(sizes)
+    results[-1]['mb_per_s'] = sum(sizes) / 1e6 / results[-1]['seconds']
+    return results
+
+
+def record_stages(path, count, memory):
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    size = len(data) * count
+    records = []
+
+    def validate():
+        records.clear()
+        for _ in range(count):
+            record = v1.FullStatus.model_validate_json(data)
+            record.snapshot_at = datetime.datetime.now(datetime.timezone.utc)
+            records.append(record)
+
+    def validate_projection():
+        model = projections.PROJECTIONS[build_stats.AGGREGATE_PROJECTION]
+        for _ in range(count):
+            model.model_validate_json(data)
+
+    def convert():
+        for record in records:
+            build_stats.v1_to_frontend(record)
+
+    def dump():
+        for record in records:
+            record.model_dump_json()
+
+    return [
+        measure('validate', validate, count, size, memory),
+        measure(f'validate-{build_stats.AGGREGATE_PROJECTION}', validate_projection, count, size, memory),
+        measure('v1_to_frontend', convert, count, size, memory),
+        measure('cache-dump', dump, count, size, memory),
+    ]
+
+
+def aggregate_stages(memory):
+    def build():
+        build_stats.create_agg_stats(full=True)
+
+    # Once to fill the caches, the measured runs decode from them
+    build()
+    columns: PlanetColumns = build_stats.load_build_state()['columns']
+    size = sum(os.path.getsize(os.path.join('docs/data', name)) for name in ('aggregates.json', 'aggregates.bin', 'aggregates_columns.json'))
+    return [measure('create_agg_stats', build, len(columns), size, memory)]
+
+
+def write_stages(scale, memory):
+    columns: PlanetColumns = build_stats.load_build_state()['columns']
+    if len(columns) == 0:
+        print("No build state, skipping write stages", file=sys.stderr)
+        return []
+    scaled = columns.repeated(scale)
+    active = set(aggregate.campaign_planets(scaled))
+    sizes = {}
+
+    def rows():
+        out = io.StringIO()
+        build_stats.write_json_array(out, aggregate.rows(scaled, active))
+        sizes['rows'] = len(out.getvalue())
+
+    def columns_json():
+        sizes['columns'] = len(json.dumps(columnar.to_json(columnar.aggregate_arrays(scaled, active))))
+
+    def binary():
+        sizes['binary'] = len(columnar.to_binary(columnar.aggregate_arrays(scaled, active)))
+
+    results = []
+    for name, run, key in (('write-aggregates.json', rows, 'rows'), ('write-aggregates_columns.json', columns_json, 'columns'),
+                           ('write-aggregates.bin', binary, 'binary')):
+        result = measure(name, run, len(scaled), 0, memory)
+        result['bytes'] = sizes[key]
+        result['mb_per_s'] = sizes[key] / 1e6 / result['seconds']
+        results.append(result)
+    return results
+
+
+def describe():
+    commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'code_commit': commit or None,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, path):
+    with open(path) as fh:
+        before = {row['stage']: row for row in json.load(fh)['stages']}
+    print(f"\n{'stage':<34}{'before s':>10}{'after s':>10}{'change':>9}")
+    for row in results:
+        old = before.get(row['stage'])
+        if old is None:
+            continue
+        print(f"{row['stage']:<34}{old['seconds']:>10.3f}{row['seconds']:>10.3f}{row['seconds'] / old['seconds'] - 1:>+9.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repo', default='.', help="git checkout with the scraped history")
+    parser.add_argument('--snapshot', help="recorded 801_full_v1.json to validate and convert, defaults to the one in --repo")
+    parser.add_argument('--snapshots', type=int, default=20, help="how many times to process the recorded snapshot")
+    parser.add_argument('--history', type=int, default=build_stats.HISTORY_LENGTH, help="how many commits to read from git")
+    parser.add_argument('--scale', type=int, default=10, help="how many times to repeat the build state for the write stages")
+    parser.add_argument('--skip-build', action='store_true', help="don't run create_agg_stats")
+    parser.add_argument('--no-memory', action='store_true', help="don't rerun stages to trace memory")
+    parser.add_argument('--output', help="where to write the results as JSON")
+    parser.add_argument('--compare', help="results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    snapshot = os.path.abspath(args.snapshot or os.path.join(args.repo, '801_full_v1.json'))
+    memory = not args.no_memory
+    output = args.output and os.path.abspath(args.output)
+    previous = args.compare and os.path.abspath(args.compare)
+    os.chdir(args.repo)
+
+    results = git_stages(args.history, memory)
+    results += record_stages(snapshot, args.snapshots, memory)
+    if not args.skip_build:
+        results += aggregate_stages(memory)
+    results += write_stages(args.scale, memory)
+
+    print(f"{'stage':<34}{'snapshots':>10}{'seconds':>10}{'snap/s':>10}{'MB/s':>9}{'peak MB':>9}")
+    for row in results:
+        rate = '-' if row['snapshots_per_s'] is None else f"{row['snapshots_per_s']:.1f}"
+        throughput = '-' if not row['bytes'] or row['mb_per_s'] is None else f"{row['mb_per_s']:.1f}"
+        peak = '-' if row['peak_bytes'] is None else f"{row['peak_bytes'] / 1e6:.1f}"
+        print(f"{row['stage']:<34}{row['snapshots']:>10}{row['seconds']:>10.3f}{rate:>10}{throughput:>9}{peak:>9}")
+
+    if output:
+        with open(output, 'w') as fh:
+            json.dump({'run': describe(), 'arguments': vars(args), 'stages': results}, fh, indent=2)
+    if previous:
+        compare(results, previous)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Builds a git repository with a synthetic war history that build_stats.py can run on.
+
+    python bench/synthetic.py DEST [--commits N] [--template 801_full_v1.json] [--seed N] [--v0]
+
+Starting from a recorded 801_full_v1.json, every commit advances the war by --interval seconds:
+players move between campaigns, liberation and defenses progress, planets change owner, defenses start and end,
+and some commits hold an API error instead of a snapshot. With --v0 each commit also gets a helldivers.json.
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+
+ENEMIES = ['Terminids', 'Automaton', 'Illuminate']
+ERRORS = [{"errors": {"detail": "Not Found"}}, {"error": "Service Unavailable"}]
+# Health removed per player per second, a couple of days for a typical campaign against regen
+DAMAGE_PER_PLAYER = 5e-3
+DEFENSE_LENGTH = 24 * 60 * 60
+
+
+def iso(when):
+    return datetime.datetime.fromtimestamp(when, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_iso(value):
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class War:
+    """The evolving state, kept in the 801_full_v1.json layout."""
+
+    def __init__(self, template, rnd: random.Random, now):
+        self.rnd = rnd
+        self.now = now
+        self.war = template['war']
+        self.planets = {p['index']: p for p in template['planets']}
+        self.assignments = template['assignments']
+        self.dispatches = template['dispatches']
+        self.campaigns = {c['planet']['index']: {key: value for key, value in c.items() if key != 'planet'} for c in template['campaigns']}
+        self.weights = {index: 1.0 for index in self.campaigns}
+        self.total_players = sum(p['statistics']['playerCount'] for p in self.planets.values())
+        self.next_id = max([c['id'] for c in self.campaigns.values()] + [0]) + 1
+        # Move recorded defenses onto the synthetic clock
+        for planet in self.planets.values():
+            event = planet['event']
+            if event is not None:
+                left = max(parse_iso(event['endTime']) - parse_iso(event['startTime']), 3600)
+                event['startTime'], event['endTime'] = iso(now), iso(now + left)
+
+    def step(self, seconds):
+        rnd = self.rnd
+        self.now += seconds
+        self.total_players = min(max(self.total_players * math.exp(rnd.gauss(0, 0.02)), 10_000), 500_000)
+        self.war['impactMultiplier'] = min(max(self.war['impactMultiplier'] * math.exp(rnd.gauss(0, 0.05)), 1e-4), 1.0)
+
+        for index in self.weights:
+            self.weights[index] *= math.exp(rnd.gauss(0, 0.1))
+        weight_sum = sum(self.weights.values()) or 1.0
+        for index, planet in self.planets.items():
+            players = round(self.total_players * self.weights[index] / weight_sum) if index in self.campaigns else rnd.randint(0, 2)
+            planet['statistics']['playerCount'] = players
+        self.war['statistics']['playerCount'] = sum(p['statistics']['playerCount'] for p in self.planets.values())
+
+        for index in list(self.campaigns):
+            self._fight(index, seconds)
+
+        if rnd.random() < 0.02:
+            self._start_defense()
+        if rnd.random() < 0.01:
+            self._start_liberation()
+        if rnd.random() < 0.01 and self.campaigns:
+            index = rnd.choice(sorted(self.campaigns))
+            if self.planets[index]['event'] is None:
+                self._end_campaign(index)
+        for assignment in self.assignments:
+            assignment['progress'] = [value + (rnd.random() < 0.05) for value in assignment['progress']]
+
+    def _fight(self, index, seconds):
+        planet = self.planets[index]
+        damage = planet['statistics']['playerCount'] * DAMAGE_PER_PLAYER * seconds
+        event = planet['event']
+        if event is not None:
+            event['health'] = max(0, int(event['health'] - damage * event['maxHealth'] / planet['maxHealth']))
+            if event['health'] == 0:
+                planet['event'] = None
+                self._end_campaign(index)
+            elif self.now >= parse_iso(event['endTime']):
+                planet['event'] = None
+                planet['currentOwner'] = event['faction']
+                planet['health'] = planet['maxHealth']
+                self.campaigns[index].update(type=0, faction='Humans')
+            return
+        regen = planet['regenPerSecond'] * seconds
+        planet['health'] = int(min(max(planet['health'] - damage + regen, 0), planet['maxHealth']))
+        if planet['health'] == 0:
+            planet['currentOwner'] = 'Humans'
+            planet['health'] = planet['maxHealth']
+            self._end_campaign(index)
+
+    def _free_planets(self, owned_by_humans):
+        return sorted(index for index, p in self.planets.items()
+                      if index not in self.campaigns and (p['currentOwner'] == 'Humans') == owned_by_humans and not p['disabled'])
+
+    def _add_campaign(self, index, kind, faction):
+        self.campaigns[index] = {'id': self.next_id, 'type': kind, 'count': self.rnd.randint(1, 30), 'faction': faction}
+        self.weights[index] = 1.0
+        self.next_id += 1
+
+    def _end_campaign(self, index):
+        self.campaigns.pop(index, None)
+        self.weights.pop(index, None)
+
+    def _start_defense(self):
+        candidates = self._free_planets(owned_by_humans=True)
+        if not candidates:
+            return
+        index = self.rnd.choice(candidates)
+        faction = self.rnd.choice(ENEMIES)
+        self._add_campaign(index, 4, faction)
+        health = self.rnd.choice([300_000, 650_000, 1_000_000])
+        self.planets[index]['event'] = {
+            'id': self.next_id, 'eventType': 1, 'faction': faction, 'health': health, 'maxHealth': health,
+            'startTime': iso(self.now), 'endTime': iso(self.now + DEFENSE_LENGTH),
+            'campaignId': self.campaigns[index]['id'], 'jointOperationIds': [self.next_id],
+        }
+        self.next_id += 1
+
+    def _start_liberation(self):
+        candidates = self._free_planets(owned_by_humans=False)
+        if candidates:
+            self._add_campaign(self.rnd.choice(candidates), 0, 'Humans')
+
+    def v1_payload(self):
+        return {
+            'war': self.war,
+            'planets': [self.planets[index] for index in sorted(self.planets)],
+            'assignments': self.assignments,
+            'campaigns': [dict(campaign, planet=self.planets[index]) for index, campaign in self.campaigns.items()],
+            'dispatches': self.dispatches,
+        }
+
+    def v0_payload(self):
+        def record(p):
+            name = p['name']['en-US'] if isinstance(p['name'], dict) else p['name']
+            return {'disabled': p['disabled'], 'hash': p['hash'], 'index': p['index'], 'initial_owner': p['initialOwner'],
+                    'max_health': p['maxHealth'], 'name': name, 'position': p['position'], 'sector': p['sector'], 'waypoints': p['waypoints']}
+
+        records = {index: record(p) for index, p in self.planets.items()}
+        campaigns = {index: {'count': c['count'], 'id': c['id'], 'planet': records[index], 'type': c['type']} for index, c in self.campaigns.items()}
+        events = []
+        for index, p in sorted(self.planets.items()):
+            event = p['event']
+            if event is None or index not in campaigns:
+                continue
+            events.append({'campaign': campaigns[index], 'event_type': event['eventType'], 'start_time': event['startTime'],
+                           'expire_time': event['endTime'], 'health': event['health'], 'max_health': event['maxHealth'],
+                           'id': event['id'], 'joint_operations': [{'id': op} for op in event['jointOperationIds']],
+                           'planet': records[index], 'race': event['faction']})
+        return {
+            'campaigns': list(campaigns.values()),
+            'impact_multiplier': self.war['impactMultiplier'],
+            'planet_attacks': [{'source': records[index], 'target': records[target]}
+                               for index, p in sorted(self.planets.items()) for target in p['attacking']],
+            'planet_status': [{'health': p['health'], 'owner': p['currentOwner'], 'planet': records[index],
+                               'players': p['statistics']['playerCount'], 'regen_per_second': p['regenPerSecond']}
+                              for index, p in sorted(self.planets.items())],
+            'planet_events': events,
+            'global_events': [{'id': d['id'], 'message': {k: v for k, v in d['message'].items() if v is not None}, 'title': None}
+                              for d in self.dispatches if isinstance(d.get('message'), dict)],
+            'snapshot_at': iso(self.now),
+            'started_at': self.war['started'],
+            'war_id': 801,
+        }
+
+
+def fast_import_commit(out, mark, when, message, files):
+    out.write(f'commit refs/heads/master\nmark :{mark}\ncommitter Synthetic <synthetic@example.com> {int(when)} +0000\n'.encode())
+    out.write(f'data {len(message)}\n{message}\n'.encode())
+    if mark > 1:
+        out.write(f'from :{mark - 1}\n'.encode())
+    for path, data in files.items():
+        out.write(f'M 100644 inline {path}\ndata {len(data)}\n'.encode())
+        out.write(data + b'\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dest', help="directory for the new repository, must not exist")
+    parser.add_argument('--commits', type=int, default=1440)
+    parser.add_argument('--template', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '801_full_v1.json'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--interval', type=int, default=600, help="seconds between commits")
+    parser.add_argument('--start', type=int, help="unix time of the first commit, defaults to --commits intervals ago")
+    parser.add_argument('--error-rate', type=float, default=0.02, help="share of commits holding an API error")
+    parser.add_argument('--v0', action='store_true', help="also write helldivers.json for fetch_all_records_v0")
+    args = parser.parse_args()
+
+    if os.path.exists(args.dest):
+        sys.exit(f"{args.dest} already exists")
+    with open(args.template) as fh:
+        template = json.load(fh)
+    rnd = random.Random(args.seed)
+    start = args.start if args.start is not None else int(datetime.datetime.now(datetime.timezone.utc).timestamp()) - args.commits * args.interval
+    war = War(copy.deepcopy(template), rnd, start)
+
+    os.makedirs(args.dest)
+    subprocess.run(['git', 'init', '-q'], cwd=args.dest, check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/master'], cwd=args.dest, check=True)
+    # Scratch repositories favour speed over pack size
+    importer = subprocess.Popen(['git', '-c', 'core.compression=1', 'fast-import', '--quiet'], cwd=args.dest, stdin=subprocess.PIPE)
+    for mark in range(1, args.commits + 1):
+        war.step(args.interval)
+        if rnd.random() < args.error_rate:
+            files = {'801_full_v1.json': json.dumps(rnd.choice(ERRORS)).encode()}
+        else:
+            files = {'801_full_v1.json': json.dumps(war.v1_payload()).encode()}
+            if args.v0:
+                files['helldivers.json'] = json.dumps(war.v0_payload()).encode()
+        fast_import_commit(importer.stdin, mark, war.now, f"Synthetic snapshot {mark}", files)
+    importer.stdin.close()
+    if importer.wait() != 0:
+        sys.exit("git fast-import failed")
+    subprocess.run(['git', 'reset', '-q', '--hard'], cwd=args.dest, check=True)
+    # build_stats.py writes its output here
+    os.makedirs(os.path.join(args.dest, 'docs', 'data'), exist_ok=True)
+    print(f"Wrote {args.commits} commits to {args.dest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,238 +1,574 @@
 #!/usr/bin/env python3
 
+import argparse
+import concurrent.futures
 import dataclasses
 from typing import Dict, List, Optional, Union
-import git
 import json
 import collections
 import datetime
 import subprocess
 import os
+import sys
 
+import numpy as np
 from pydantic import RootModel, TypeAdapter, ValidationError
-from models import frontend, v0, v1
+from models import frontend, projections, v0, v1
+from stats import aggregate, assignments, changes, columnar, defenses, forecast, lod, rolling, shards, trace
+from stats.gitobjects import GitObjectReader, SnapshotRef, log_snapshots
+from stats.columns import PlanetColumns
+from stats.memo import ConversionMemo
+from stats.migrations import MigrationRegistry
+from stats.snapshot_cache import Rejection, SnapshotCache
 
 PLANET_INDEXES = range(261)
 
 CACHE_DIR = '_cache'
-# Bump this with any changes to `fetch_all_records`
+# Bump this with any changes to the records `fetch_all_records` caches,
+# and register a step from the previous version in V1_MIGRATIONS so the cache can be upgraded instead of re-read from git.
+# The build state and archive are kept across bumps, bump BUILD_STATE_VERSION too when the columns need the new records
 CACHE_VERSION = 2
+V1_MIGRATIONS = MigrationRegistry()
 
+# Bump this with any changes to `v1_to_frontend` or `models.frontend`
+CONVERTER_VERSION = 1
+_frontend_memo: Optional[ConversionMemo] = None
 
-def git_commits_for(path):
-    return subprocess.check_output(['git', 'log', "--format=%H", path]).strip().decode().splitlines()
+# Matches the checkout depth of the scrape workflow
+HISTORY_LENGTH = 1440
 
-def git_show(ref, name, repo_client):
-    commit_tree = repo_client.commit(ref).tree
+# Decoded snapshots queued per worker ahead of the stage consuming them
+PIPELINE_DEPTH = 4
 
-    return commit_tree[name].data_stream.read()
+BUILD_STATE_PATH = os.path.join(CACHE_DIR, 'build_state.npz')
+# Where each build's timing spans go
+BUILD_REPORT_PATH = os.path.join('docs', 'data', 'build_report.json')
+# Bump this with any changes to `stats.columns.PlanetColumns` or `stats.rolling.RollingStats`
+BUILD_STATE_VERSION = 11
+
+# History kept for longer than the checkout depth. It cannot be rebuilt from git, so it lives apart from the build state
+# and outlives resets of it, a part only starts over when its own version changes.
+ARCHIVE_PATH = os.path.join(CACHE_DIR, 'archive.npz')
+# Bump a part's version with any changes to how it is stored
+ARCHIVE_PARTS = {
+    'lod': (lod.Pyramid, 1),
+    'changes': (changes.ChangeLog, 1),
+    'assignments': (assignments.AssignmentHistory, 1),
+    'defenses': (defenses.DefenseIndex, 1),
+}
 
-def fetch_all_records_v0():
-    commits = git_commits_for("helldivers.json")[:1440]
 
-    repo = git.Repo('.', odbt=git.db.GitCmdObjectDB)
+def git_is_ancestor(ref):
+    return subprocess.run(['git', 'merge-base', '--is-ancestor', ref, 'HEAD'], stderr=subprocess.DEVNULL).returncode == 0
+
+def fetch_all_records_v0():
+    snapshots = log_snapshots("helldivers.json", limit=HISTORY_LENGTH)
 
     out: List[v0.FullStatus] = []
 
-    for ref in commits:
-        cache_path = os.path.join(CACHE_DIR, "v0", ref[:2], ref[2:] + ".json")
+    with GitObjectReader() as reader, SnapshotCache(os.path.join(CACHE_DIR, "v0")) as cache:
+        for snapshot in snapshots:
+            ref = snapshot.commit
+            blob = snapshot.blob or cache.blob_for(ref)
 
-        if os.path.exists(cache_path):
-            with open(cache_path) as fh:
+            if blob is not None and is_rejected(cache, blob):
+                continue
+            if blob is not None:
                 try:
-                    record = TypeAdapter(v0.FullStatus).validate_json(fh.read())
+                    record = cache.get(blob, TypeAdapter(v0.FullStatus).validate_json)
                 except ValidationError as exc:
                     print(f"Bad cached data {exc}")
-                    continue
-                if record.version == CACHE_VERSION:
+                    record = None
+                if record is not None and record.version == CACHE_VERSION:
+                    record.snapshot_at = snapshot.snapshot_at
+                    cache.remember(snapshot, blob)
                     out.append(record)
                     continue
-        try:
-            record = TypeAdapter(v0.FullStatus).validate_json(git_show(ref, 'helldivers.json', repo))
-        except ValidationError as exc:
-            res = json.loads(git_show(ref, 'helldivers.json', repo))
-            if 'error' in res.keys() or 'errors' in res.keys():
+            blob, data = reader.read_snapshot(snapshot, 'helldivers.json')
+            if data is None:
+                print(f"No v0 data for commit {ref}")
                 continue
-            print(f"Bad committed v0 data {exc.errors(include_url=False,include_input=False)}")
-        timestamp = repo.commit(ref).committed_datetime.astimezone(datetime.timezone.utc)
-        record.snapshot_at = timestamp
-        record.version = CACHE_VERSION
-        
-        out.append(record)
-            
-        try:
-            os.makedirs(os.path.dirname(cache_path))
-        except FileExistsError:
-            pass
-        with open(cache_path, 'w') as fh:
-            fh.write(RootModel[v0.FullStatus](record).model_dump_json())
+            try:
+                record = TypeAdapter(v0.FullStatus).validate_json(data)
+            except ValidationError as exc:
+                if is_api_error(data):
+                    cache.reject(snapshot, blob, Rejection('api-error', CACHE_VERSION))
+                    continue
+                print(f"Bad committed v0 data {exc.errors(include_url=False,include_input=False)}")
+                cache.reject(snapshot, blob, Rejection('invalid', CACHE_VERSION))
+                continue
+            record.snapshot_at = snapshot.snapshot_at
+            record.version = CACHE_VERSION
+
+            out.append(record)
 
+            cache.put(blob, RootModel[v0.FullStatus](record).model_dump_json())
+            cache.remember(snapshot, blob)
 
     out.sort(key=lambda row: row.snapshot_at)
     return out
 
-def fetch_all_records_v1():
-    commits = git_commits_for("801_full_v1.json")[:1440]
-
-    repo = git.Repo('.', odbt=git.db.GitCmdObjectDB)
+def fetch_all_records_v1(workers=1):
+    return fetch_records_v1(log_snapshots("801_full_v1.json", limit=HISTORY_LENGTH), workers=workers)
 
-    out: List[v1.FullStatus] = []
-
-    for ref in commits:
-        cache_path = os.path.join(CACHE_DIR, "v1", ref[:2], ref[2:] + ".json")
+def fetch_records_v1(snapshots: List[SnapshotRef], workers=1, projection='full'):
+    out: List[v1.FullStatus] = [record for (_, record) in iter_records_v1(snapshots, workers=workers, projection=projection)]
+    out.sort(key=lambda row: row.snapshot_at)
+    return out
 
-        if os.path.exists(cache_path):
-            with open(cache_path) as fh:
-                try:
-                    record = v1.FullStatus.model_validate_json(fh.read())
-                except ValidationError as exc:
-                    print(f"Bad cached data {exc}")
-                    continue
-                if record.version == CACHE_VERSION:
-                    out.append(record)
-                    continue
-        try:
-            record = v1.FullStatus.model_validate_json(git_show(ref, '801_full_v1.json', repo))
-        except ValidationError as exc:
-            if ref.startswith('a514ea'):
-                continue
-            res = json.loads(git_show(ref, '801_full_v1.json', repo))
-            if 'error' in res.keys() or 'errors' in res.keys():
-                continue
-            print(f"Bad committed v1 data for commit {ref} {exc.errors(include_url=False, include_input=False)}")
+def iter_records_v1(snapshots: List[SnapshotRef], workers=1, projection='full'):
+    """Yields (snapshot, record) for every usable snapshot in the order given, caching what had to be read from git.
+
+    Records are decoded as the named view from `models.projections`.
+
+    With more than one worker, decoding and validation run in a process pool.
+    Cache entries are serialized by the workers but only this process writes to the pack.
+    At most `PIPELINE_DEPTH` results per worker are in flight, so a slow consumer never leaves the whole history queued up."""
+    with v1_snapshot_cache() as cache:
+        with trace.span('migrate'):
+            cache.migrate(V1_MIGRATIONS, CACHE_VERSION)
+        if workers > 1 and len(snapshots) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_fetch_worker) as pool:
+                results = _ordered_map(pool, _fetch_in_worker, snapshots, projection, window=PIPELINE_DEPTH * workers)
+                yield from _store_fetched(cache, snapshots, results)
+        else:
+            with GitObjectReader() as reader:
+                results = (decode_record_v1(snapshot, reader, cache, projection) for snapshot in snapshots)
+                yield from _store_fetched(cache, snapshots, results)
+
+def _ordered_map(pool, fn, snapshots, projection, window):
+    pending = collections.deque()
+    for snapshot in snapshots:
+        pending.append(pool.submit(fn, snapshot, projection))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _store_fetched(cache: SnapshotCache, snapshots, results):
+    written = set()
+    for snapshot, (record, blob, payload) in zip(snapshots, results):
+        if record is None:
+            if isinstance(payload, Rejection):
+                cache.reject(snapshot, blob, payload)
+                trace.add('rejected')
+            else:
+                trace.add('skipped')
             continue
-        timestamp = repo.commit(ref).committed_datetime.astimezone(datetime.timezone.utc)
-        record.snapshot_at = timestamp
-        record.version = CACHE_VERSION
-        
-        out.append(record)
-            
+        if payload is None:
+            trace.add('cache_hits')
+        else:
+            trace.add('cache_misses')
+        if payload is not None and blob not in written:
+            cache.put(blob, payload)
+            written.add(blob)
+            trace.add('cache_bytes_written', len(payload))
+        cache.remember(snapshot, blob)
+        yield snapshot, record
+
+_worker_state = {}
+
+def _init_fetch_worker():
+    _worker_state['reader'] = GitObjectReader()
+    _worker_state['cache'] = v1_snapshot_cache()
+
+def _fetch_in_worker(snapshot, projection):
+    return decode_record_v1(snapshot, _worker_state['reader'], _worker_state['cache'], projection)
+
+def v1_snapshot_cache():
+    return SnapshotCache(os.path.join(CACHE_DIR, "v1"))
+
+def fetch_record_v1(snapshot: SnapshotRef, reader: GitObjectReader, cache: SnapshotCache, projection='full') -> Optional[v1.FullStatus]:
+    for (_, record) in _store_fetched(cache, [snapshot], [decode_record_v1(snapshot, reader, cache, projection)]):
+        return record
+    return None
+
+def decode_record_v1(snapshot: SnapshotRef, reader: GitObjectReader, cache: SnapshotCache, projection='full'):
+    """Returns (record, blob id, payload).
+
+    The payload is the cache entry to write when the record was read from git,
+    or the Rejection to remember when the snapshot turned out to be unusable."""
+    ref = snapshot.commit
+    blob = snapshot.blob or cache.blob_for(ref)
+    model = projections.PROJECTIONS[projection]
+
+    if blob is not None:
+        if is_rejected(cache, blob):
+            return None, blob, None
         try:
-            os.makedirs(os.path.dirname(cache_path))
-        except FileExistsError:
-            pass
-        with open(cache_path, 'w') as fh:
-            fh.write(record.model_dump_json())
-
-
-    out.sort(key=lambda row: row.snapshot_at)
-    return out
+            record = cache.get(blob, model.model_validate_json)
+        except ValidationError as exc:
+            print(f"Bad cached data {exc}")
+            record = None
+        if record is not None and record.version == CACHE_VERSION:
+            # The same payload can be committed more than once, the commit decides the time
+            record.snapshot_at = snapshot.snapshot_at
+            return record, blob, None
+    blob, data = reader.read_snapshot(snapshot, '801_full_v1.json')
+    if data is None:
+        # Not rejected, a missing object can turn up with a deeper fetch, so it is looked up again next time
+        print(f"No v1 data for commit {ref}")
+        return None, blob, None
+    if blob is not None and is_rejected(cache, blob):
+        return None, blob, None
+    try:
+        record = v1.FullStatus.model_validate_json(data)
+    except ValidationError as exc:
+        if is_api_error(data):
+            return None, blob, Rejection('api-error', CACHE_VERSION)
+        print(f"Bad committed v1 data for commit {ref} {exc.errors(include_url=False, include_input=False)}")
+        return None, blob, Rejection('invalid', CACHE_VERSION)
+    record.snapshot_at = snapshot.snapshot_at
+    record.version = CACHE_VERSION
+    payload = record.model_dump_json()
+    if model is not v1.FullStatus:
+        # The cache always holds the full record, other views are decoded from it
+        record = model.model_validate_json(payload)
+
+    return record, blob, payload
+
+def is_rejected(cache: SnapshotCache, blob) -> bool:
+    rejection = cache.rejection(blob)
+    # Payloads that did not validate get another chance with a newer schema
+    return rejection is not None and (rejection.reason == 'api-error' or rejection.version == CACHE_VERSION)
+
+def is_api_error(data) -> bool:
+    try:
+        res = json.loads(data)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(res, dict) and ('error' in res.keys() or 'errors' in res.keys())
 
 RECENCY = 6 * 24 
 
-def create_agg_stats():
-    records = [v1_to_frontend(rec) for rec in fetch_all_records_v1()]
-    players = [0]*len(records)
-    timestamps = []
-    time_correction = []
-    impact = []
-    active = set([campaign.planet.index for campaign in records[len(records)-1].active])
-    active_sum = {p:0 for p in active}
-    active_planet_hist = []
-
-
-    recent_start = len(records) - (RECENCY)
-    for (step, record) in enumerate(records):
-        active_step = {}
-        for status in record.planets.values():
-            players[step] += status.statistics.player_count
-            if status.index in active:
-                active_step[status.index] = {'players': status.statistics.player_count, 'liberation': status.liberation}
-                if step > recent_start:
-                    active_sum[status.index] += status.statistics.player_count
-        for event in record.events:
-            planet = record.planets[event.planet.index]
-            active_step[event.planet.index] = {'players': planet.statistics.player_count, 'liberation': event.liberation}
-        active_planet_hist.append(active_step)
-
-    most_active = sorted(active_sum.items(), key=lambda x: x[1], reverse=True)
-
-    for step in records:
-        timestamps.append(step.snapshot_at)
-        impact.append(step.war.impact_multiplier)
-
-    with open('./docs/data/aggregates.json', 'w') as fh:
-        json.dump([{'timestamp':v1, 'players': v2, 'impact': v3, 'attacks': v4} for v1, v2, v3, v4 in zip(timestamps, players, impact, active_planet_hist)], fh)
-    with open('./docs/data/recent_attacks.json', 'w') as fh:
+# The view of 801_full_v1.json each stage decodes, see models.projections
+AGGREGATE_PROJECTION = 'planet-metrics'
+CURRENT_STATUS_PROJECTION = 'full'
+
+def empty_build_state():
+    return {'version': BUILD_STATE_VERSION, 'head': None, 'commits': [], 'columns': PlanetColumns(), 'rolling': rolling.RollingStats()}
+
+def load_build_state(full=False):
+    """The saved build state, or an empty one with `full` or when it cannot be used, together with the archive parts.
+
+    Parts of the archive skip the snapshots they have seen, so they carry on where they left off when the build state starts over."""
+    state = empty_build_state() if full else _load_build_state()
+    state.update(load_archive())
+    return state
+
+def _load_build_state():
+    if not os.path.exists(BUILD_STATE_PATH):
+        return empty_build_state()
+    try:
+        with np.load(BUILD_STATE_PATH) as arrays:
+            state = json.loads(str(arrays['state']))
+            state['columns'] = PlanetColumns.from_arrays(arrays)
+            state['rolling'] = rolling.RollingStats.from_arrays(arrays)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"Bad build state {exc}")
+        return empty_build_state()
+    if state.get('version') != BUILD_STATE_VERSION:
+        return empty_build_state()
+    if state['head'] is not None and not git_is_ancestor(state['head']):
+        # History was rewritten under us, start over
+        return empty_build_state()
+    return state
+
+def load_archive():
+    parts = {name: part() for name, (part, _) in ARCHIVE_PARTS.items()}
+    if not os.path.exists(ARCHIVE_PATH):
+        return parts
+    try:
+        with np.load(ARCHIVE_PATH) as arrays:
+            versions = json.loads(str(arrays['versions']))
+            for name, (part, version) in ARCHIVE_PARTS.items():
+                if versions.get(name) == version:
+                    parts[name] = part.from_arrays(arrays)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"Bad archive {exc}")
+        return {name: part() for name, (part, _) in ARCHIVE_PARTS.items()}
+    return parts
+
+def save_build_state(state):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta = {key: value for key, value in state.items() if key not in ('columns', 'rolling') and key not in ARCHIVE_PARTS}
+    archive = {}
+    for name in ARCHIVE_PARTS:
+        archive.update(state[name].to_arrays())
+    versions = {name: version for name, (_, version) in ARCHIVE_PARTS.items()}
+    # Both are uploaded to the Actions cache after every run, the arrays compress well
+    for path, arrays in ((BUILD_STATE_PATH, dict(state=np.array(json.dumps(meta)), **state['columns'].to_arrays(), **state['rolling'].to_arrays())),
+                         (ARCHIVE_PATH, dict(versions=np.array(json.dumps(versions)), **archive))):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(tmp_path, path)
+
+def update_build_state(state, workers=1):
+    """Ingest the commits added since the last run, evicting snapshots that fell out of the history window."""
+    with trace.span('git-log'):
+        new_snapshots = log_snapshots("801_full_v1.json", since=state['head'], limit=HISTORY_LENGTH)
+        trace.add('commits', len(new_snapshots))
+    if not new_snapshots:
+        return
+    commits = ([s.commit for s in new_snapshots] + state['commits'])[:HISTORY_LENGTH]
+    columns: PlanetColumns = state['columns']
+    columns.select(np.isin(columns.commit, commits))
+
+    with trace.span('decode'):
+        # Oldest first, the assignment history and defense index take each record as it is decoded and skip older ones
+        for snapshot, record in iter_records_v1(new_snapshots[::-1], workers=workers, projection=AGGREGATE_PROJECTION):
+            columns.append(snapshot, record)
+            state['assignments'].update(record.snapshot_ms, record.assignments)
+            state['defenses'].update(record.snapshot_ms, [(p.index, p.event) for p in record.planets if p.event is not None],
+                                     columns.owner[-1], columns.owners)
+            trace.add('snapshots')
+            trace.sample()
+        columns.sort()
+    new_rows = np.isin(columns.commit, [s.commit for s in new_snapshots])
+    with trace.span('lod'):
+        state['lod'].update(columns, new_rows)
+    with trace.span('changes'):
+        state['changes'].update(columns, new_rows)
+        trace.add('changes', len(state['changes']))
+    with trace.span('rolling'):
+        state['rolling'].update(columns, new_rows)
+
+    state['head'] = new_snapshots[0].commit
+    state['commits'] = commits
+
+def frontend_memo() -> ConversionMemo:
+    """Opened on first use, so the cache is found relative to the directory the build runs in."""
+    global _frontend_memo
+    if _frontend_memo is None:
+        _frontend_memo = ConversionMemo(os.path.join(CACHE_DIR, 'frontend'), CONVERTER_VERSION)
+    return _frontend_memo
+
+def fetch_frontend_v1(snapshot: SnapshotRef, reader: GitObjectReader, cache: SnapshotCache) -> Optional[frontend.CurrentStatus]:
+    """The frontend view of a snapshot, converted once per payload and shared with every other caller."""
+    def convert():
+        record = fetch_record_v1(snapshot, reader, cache, CURRENT_STATUS_PROJECTION)
+        return None if record is None else v1_to_frontend(record)
+
+    blob = snapshot.blob or cache.blob_for(snapshot.commit)
+    if blob is None:
+        return convert()
+    converted = frontend_memo().get(blob, convert)
+    if converted is None:
+        return None
+    # The same payload can be committed more than once, the commit decides the time
+    return converted.model_copy(update={'snapshot_at': ms(snapshot.snapshot_at)})
+
+def fetch_latest_frontend(columns: PlanetColumns):
+    timestamp = int(columns.timestamp[-1])
+    snapshot = SnapshotRef(str(columns.commit[-1]), datetime.datetime.fromtimestamp(timestamp/1000, datetime.timezone.utc), str(columns.blob[-1]) or None)
+    with GitObjectReader() as reader, v1_snapshot_cache() as cache:
+        return fetch_frontend_v1(snapshot, reader, cache)
+
+def create_agg_stats(full=False, workers=1):
+    with trace.span('load-state'):
+        state = load_build_state(full=full)
+    with trace.span('update'):
+        update_build_state(state, workers=workers)
+    columns: PlanetColumns = state['columns']
+    with trace.span('convert'):
+        latest = fetch_latest_frontend(columns)
+    with trace.span('save-state'):
+        save_build_state(state)
+        trace.add('bytes', os.path.getsize(BUILD_STATE_PATH) + os.path.getsize(ARCHIVE_PATH))
+
+    with trace.span('aggregate'):
+        # A set like the loop this replaced, recent_attacks.json lists ties in its iteration order rather than campaign order
+        active = set(aggregate.campaign_planets(columns))
+        active_sum = aggregate.recent_player_sums(columns, active, RECENCY)
+        most_active = sorted(active_sum.items(), key=lambda x: x[1], reverse=True)
+        arrays = columnar.aggregate_arrays(columns, active)
+        forecasts = forecast.forecast(columns)
+        major_orders = state['assignments'].summary(columns.progress(-1) if len(columns) else np.zeros(0), forecasts)
+        trace.add('snapshots', len(columns))
+
+    # The per snapshot history is built while aggregates.json is written
+    with trace.span('write:aggregates.json'), open('./docs/data/aggregates.json', 'w') as fh:
+        write_json_array(fh, aggregate.rows(columns, active))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:aggregates_columns.json'), open('./docs/data/aggregates_columns.json', 'w') as fh:
+        fh.write(json.dumps(columnar.to_json(arrays)))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:aggregates.bin'), open('./docs/data/aggregates.bin', 'wb') as fh:
+        fh.write(columnar.to_binary(arrays))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:history'):
+        shards.write_shards('./docs/data/history', arrays)
+        trace.add('bytes', tree_size('./docs/data/history'))
+    with trace.span('write:lod'):
+        write_lod('./docs/data/lod', state['lod'])
+        trace.add('bytes', tree_size('./docs/data/lod'))
+    with trace.span('write:changes.json'), open('./docs/data/changes.json', 'w') as fh:
+        fh.write(json.dumps(state['changes'].to_json(columns.owners)))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:rolling.json'), open('./docs/data/rolling.json', 'w') as fh:
+        fh.write(json.dumps(state['rolling'].to_json(sorted(active))))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:forecasts.json'), open('./docs/data/forecasts.json', 'w') as fh:
+        fh.write(json.dumps(forecasts))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:major_orders.json'), open('./docs/data/major_orders.json', 'w') as fh:
+        fh.write(json.dumps(major_orders))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:defenses.json'), open('./docs/data/defenses.json', 'w') as fh:
+        fh.write(json.dumps(state['defenses'].to_json()))
+        trace.add('bytes', fh.tell())
+    with trace.span('write:recent_attacks.json'), open('./docs/data/recent_attacks.json', 'w') as fh:
         json.dump(most_active, fh)
-    with open('./docs/data/current_status.json', 'w') as fh:
-        fh.write(records[-1].model_dump_json())
+        trace.add('bytes', fh.tell())
+    with trace.span('write:current_status.json'), open('./docs/data/current_status.json', 'w') as fh:
+        fh.write(latest.model_dump_json())
+        trace.add('bytes', fh.tell())
+
+    with trace.span('compact'), v1_snapshot_cache() as cache:
+        # Keeps the pack from growing forever while only rewriting it every so often
+        if len(cache.pack) > 2 * HISTORY_LENGTH:
+            cache.compact(HISTORY_LENGTH)
+        frontend_memo().trim()
+
+def tree_size(root):
+    return sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(root) for name in names)
+
+def write_lod(root, pyramid: lod.Pyramid):
+    os.makedirs(root, exist_ok=True)
+    written = {'manifest.json'}
+    for level in lod.LEVELS:
+        for group, metrics in lod.FILES.items():
+            arrays = pyramid.level_arrays(level.name, metrics)
+            written.add(lod.path(level, group))
+            with open(os.path.join(root, lod.path(level, group)), 'wb') as fh:
+                fh.write(columnar.to_binary(arrays, lod.binary_dtypes(arrays)))
+    with open(os.path.join(root, 'manifest.json'), 'w') as fh:
+        fh.write(json.dumps(lod.manifest(pyramid)))
+    # Files of an older layout would otherwise be deployed forever
+    for name in os.listdir(root):
+        if name not in written:
+            os.remove(os.path.join(root, name))
+
+def write_json_array(fh, items):
+    """Writes the same text as `json.dump(list(items), fh)` without building the list.
+
+    Each item is encoded with json.dumps, which runs in C where json.dump to a file does not."""
+    fh.write('[')
+    for position, item in enumerate(items):
+        if position:
+            fh.write(', ')
+        fh.write(json.dumps(item))
+    fh.write(']')
 
 def wrap_if_str(val):
     if isinstance(val, str):
         return {'en-US':val}
     return val
 
+def ms(when: datetime.datetime) -> int:
+    return int(when.timestamp()*1000)
+
+# Conversions never modify their input, so converted records can be cached and shared.
+# The frontend models are built straight from the validated v1 values instead of dumping each
+# object to a dict and validating that again. Nested frontend models are passed in as instances,
+# which pydantic keeps as they are, so a planet and the defense on it share one frontend.Planet.
+
+def v1_statistics_to_frontend(stats: Optional[v1.Statistics]) -> Optional[frontend.Statistics]:
+    if stats is None:
+        return None
+    return frontend.Statistics(**{name: getattr(stats, name) for name in frontend.Statistics.model_fields})
+
+def v1_planet_to_frontend(planet: v1.Planet) -> frontend.Planet:
+    return frontend.Planet(
+        position=frontend.Position(x=planet.position.x * 100, y=planet.position.y * 100),
+        index=planet.index,
+        name=wrap_if_str(planet.name),
+        sector=planet.sector,
+        waypoints=planet.waypoints,
+        disabled=planet.disabled,
+        regen_per_second=planet.regen_per_second,
+        current_owner=planet.current_owner,
+        initial_owner=planet.initial_owner,
+        health=planet.health,
+        max_health=planet.max_health,
+        statistics=v1_statistics_to_frontend(planet.statistics),
+        attacking=planet.attacking,
+    )
+
+def v1_event_to_frontend(event: v1.Event, planet: frontend.Planet) -> frontend.Defense:
+    return frontend.Defense(
+        id=event.id,
+        faction=event.faction,
+        type=event.event_type,
+        start_time=ms(event.start_time),
+        end_time=ms(event.end_time),
+        health=event.health,
+        max_health=event.max_health,
+        joint_operation_ids=event.joint_operation_ids,
+        planet=planet,
+    )
+
+def v1_assignment_to_frontend(assignment: v1.Assignment2) -> frontend.Assignment:
+    return frontend.Assignment(
+        id=assignment.id,
+        title=wrap_if_str(assignment.title),
+        briefing=wrap_if_str(assignment.briefing),
+        description=wrap_if_str(assignment.description),
+        tasks=[frontend.Task(type=task.type, values=task.values, value_types=task.value_types) for task in assignment.tasks],
+        progress=assignment.progress,
+        expiration=ms(assignment.expiration),
+        reward=None if assignment.reward is None else frontend.Reward(type=assignment.reward.type, amount=assignment.reward.amount),
+    )
+
+def v1_campaign_to_frontend(campaign: v1.Campaign2) -> frontend.Campaign:
+    # Campaigns come from a separate API call, so their planet is converted on its own
+    return frontend.Campaign(
+        id=campaign.id,
+        planet=v1_planet_to_frontend(campaign.planet),
+        type=campaign.type,
+        count=campaign.count,
+    )
+
 def v1_to_frontend(v1_rec: v1.FullStatus) -> frontend.CurrentStatus:
-    planets = []
+    planets: Dict[int, frontend.Planet] = {}
     events = []
 
     for planet in v1_rec.planets:
-        planet.name = wrap_if_str(planet.name) 
-        planet.position.x *= 100
-        planet.position.y *= 100
-        planets.append(frontend.Planet.model_validate(planet.model_dump()))
+        converted = v1_planet_to_frontend(planet)
+        planets[planet.index] = converted
         if planet.event is not None:
-            events.append(frontend.Defense.model_validate({
-                'id': planet.event.id,
-                'faction':planet.event.faction,
-                'type':planet.event.event_type,
-                'start_time':int(planet.event.start_time.timestamp()*1000),
-                'end_time':int(planet.event.end_time.timestamp()*1000),
-                'health':planet.event.health,
-                'max_health':planet.event.max_health,
-                'joint_operation_ids': planet.event.joint_operation_ids,
-                'planet': planet.model_dump(),
-            }))
-
-    assignments = []
-    for assignment in v1_rec.assignments:
-        assignments.append(frontend.Assignment.model_validate({
-            'id': assignment.id,
-            'title': wrap_if_str(assignment.title),
-            'briefing': wrap_if_str(assignment.briefing),
-            'description': wrap_if_str(assignment.description),
-            'tasks': [task.model_dump() for task in assignment.tasks],
-            'reward': None if assignment.reward is None else assignment.reward.model_dump(),
-            'progress': assignment.progress,
-            'expiration': int(assignment.expiration.timestamp()*1000),
-        }))
-    stats = v1_rec.war.statistics
-    war_details = frontend.WarDetails.model_validate({
-        'start_time': int(v1_rec.war.started.timestamp()*1000),
-        'end_time': int(v1_rec.war.ended.timestamp()*1000),
-        'now': int(v1_rec.war.now.timestamp()*1000),
-        'factions': v1_rec.war.factions,
-        'impact_multiplier': v1_rec.war.impact_multiplier,
-        'statistics': frontend.Statistics.model_validate(v1_rec.war.statistics.model_dump()),
-    })
+            events.append(v1_event_to_frontend(planet.event, converted))
 
-    campaigns = []
-    for campaign in v1_rec.campaigns:
-        campaign.planet.name = wrap_if_str(campaign.planet.name)
-        campaign.planet.position.x *= 100
-        campaign.planet.position.y *= 100
-        campaigns.append(frontend.Campaign.model_validate(campaign.model_dump()))
+    war_details = frontend.WarDetails(
+        start_time=ms(v1_rec.war.started),
+        end_time=ms(v1_rec.war.ended),
+        now=ms(v1_rec.war.now),
+        factions=v1_rec.war.factions,
+        impact_multiplier=v1_rec.war.impact_multiplier,
+        statistics=v1_statistics_to_frontend(v1_rec.war.statistics),
+    )
 
     dispatches: List[frontend.Dispatch] = []
     for dispatch in v1_rec.dispatches:
         if dispatch.message is None:
             continue
-        dispatches.append(frontend.Dispatch.model_validate({
-            'id': dispatch.id,
-            'message': wrap_if_str(dispatch.message),
-            'title':wrap_if_str('Dispatch'),
-        }))
-
-    return frontend.CurrentStatus.model_validate({
-        'events': events,
-        'planets': planets,
-        'assignments': assignments,
-        'war': war_details,
-        'active': campaigns,
-        'dispatches': dispatches,
-        'snapshot_at': int(v1_rec.snapshot_at.timestamp()*1000),
-    })
+        dispatches.append(frontend.Dispatch(
+            id=dispatch.id,
+            message=wrap_if_str(dispatch.message),
+            title=wrap_if_str('Dispatch'),
+            faction=None,
+        ))
+
+    return frontend.CurrentStatus(
+        events=events,
+        planets=list(planets.values()),
+        assignments=[v1_assignment_to_frontend(assignment) for assignment in v1_rec.assignments],
+        war=war_details,
+        active=[v1_campaign_to_frontend(campaign) for campaign in v1_rec.campaigns],
+        dispatches=dispatches,
+        snapshot_at=ms(v1_rec.snapshot_at),
+    )
 
 def v0_to_frontend(v0_rec: v0.FullStatus) -> frontend.CurrentStatus:
     events = []
@@ -299,8 +635,50 @@ def v0_to_frontend(v0_rec: v0.FullStatus) -> frontend.CurrentStatus:
         'snapshot_at': war_details.now,
     })
 
-if __name__ == "__main__":
-    create_agg_stats()
-# Plotting recent attacks based solely on player count is a bit boring sometimes. Maybe we should use variance of liberation?
+def verify_caches():
+    ok = True
+    for version in ("v0", "v1"):
+        with SnapshotCache(os.path.join(CACHE_DIR, version)) as cache:
+            for problem in cache.verify():
+                print(f"{version}: {problem}")
+                ok = False
+    return ok
+
+def compact_caches():
+    for version in ("v0", "v1"):
+        with SnapshotCache(os.path.join(CACHE_DIR, version)) as cache:
+            cache.compact(HISTORY_LENGTH)
 
-# intial_owner's do change, such as when we lost the defense of Angel's Venture. We should keep track of these and add them to the message logs
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the dashboard data files from the scraped git history")
+    parser.add_argument('command', nargs='?', default='build', choices=['build', 'verify', 'compact'],
+                        help="build the data files (default), check the snapshot caches for corruption, or drop cached snapshots outside the history window")
+    parser.add_argument('--full', action='store_true', help="ignore the saved build state and rebuild from the whole history, "
+                                                            "the archive of older history is kept")
+    parser.add_argument('--workers', type=int, help="processes used to decode snapshots that are not cached yet (default: one per CPU, 1 with --memory)")
+    parser.add_argument('--trace-events', metavar='PATH', help="also write the build's timing spans as a Chrome trace event file")
+    parser.add_argument('--memory', action='store_true', help="add peak and retained memory and live models per stage to the build report, "
+                                                              "much slower and decodes in this process, as worker processes are not measured")
+    args = parser.parse_args()
+    if args.memory and args.workers not in (None, 1):
+        parser.error("--memory cannot measure worker processes, use it with --workers 1")
+    if args.workers is None:
+        args.workers = 1 if args.memory else os.cpu_count()
+    if args.command == 'verify':
+        sys.exit(0 if verify_caches() else 1)
+    elif args.command == 'compact':
+        compact_caches()
+    else:
+        if args.memory:
+            trace.TRACER.enable_memory()
+        with trace.span('build'):
+            create_agg_stats(full=args.full, workers=args.workers)
+        trace.TRACER.write_report(BUILD_REPORT_PATH)
+        for span in trace.TRACER.spans:
+            if span.memory is not None:
+                print(f"{'  ' * span.depth}{span.name}: peak {span.memory['peak_bytes'] / 1e6:.1f} MB, retained {span.memory['retained_bytes'] / 1e6:+.1f} MB")
+        if args.trace_events:
+            trace.TRACER.write_trace_events(args.trace_events)
+# Plotting recent attacks based solely on player count is a bit boring sometimes. rolling.json ranks them by variance of liberation and more, the plots could use it
+
+# intial_owner's do change, such as when we lost the defense of Angel's Venture. These are logged in changes.json now, but still need adding to the message logs
\ No newline at end of file
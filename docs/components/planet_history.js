@@ -13,59 +13,139 @@ const MajorOrderTypes = {
     13: "Control",
 };
 
-export function getMajorOrderDetails(majorOrder, planets, lang){
-    const results = [];
-    for(let index = 0; index < majorOrder.tasks.length; index++){
-        const task = majorOrder.tasks[index];
-        switch (task.type) {
-            case 3:
-            case 7: {
-                const progress = majorOrder.progress[index];
-                const target = task.values[2];
+const TYPED_ARRAYS = {
+    "<f8": Float64Array,
+    "<f4": Float32Array,
+    "<i4": Int32Array,
+};
 
-                const value = (progress / target) * 100;
+// Arrays of aggregates.bin as typed arrays viewing the buffer, see stats/columnar.py
+export function aggregateArrays(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if(magic !== "HDAG" || view.getUint32(4, true) !== 1) {
+        throw new Error("Unsupported aggregates file");
+    }
+    const headerLength = view.getUint32(8, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, headerLength)));
+    const start = 12 + headerLength;
+    const arrays = {};
+    for(const [name, [dtype, offset, shape]] of Object.entries(header.arrays)) {
+        arrays[name] = new TYPED_ARRAYS[dtype](buffer, start + offset, shape.reduce((a, b) => a * b, 1));
+    }
+    return arrays;
+}
 
-                results.push({
-                    type: MajorOrderTypes[task.type],
-                    percent: value,
-                    target: target,
-                    faction: task.values[0],
-                    status: `${progress} / ${target} (${value.toFixed(2)}%)`
-                });
-                break;
+// The same rows as aggregates.json
+export function aggregateRows(arrays) {
+    const count = arrays.timestamp.length;
+    const planets = arrays.planets;
+    const rows = new Array(count);
+    for(let i = 0; i < count; i++) {
+        const attacks = {};
+        for(let p = 0; p < planets.length; p++) {
+            const liberation = arrays.attack_liberation[p*count + i];
+            if(!Number.isNaN(liberation)) {
+                attacks[planets[p]] = {players: arrays.attack_players[p*count + i], liberation: liberation};
             }
-            case 12: {
-                const progress = majorOrder.progress[index];
-                const target = task.values[0];
+        }
+        rows[i] = {timestamp: arrays.timestamp[i], players: arrays.players[i], impact: arrays.impact[i], attacks: attacks};
+    }
+    return rows;
+}
 
-                const value = (progress / target) * 100;
+// The coarsest level of docs/data/lod with at least one bucket per `pixelsPerPoint` pixels over `rangeMs`,
+// out of those keeping buckets for all of `rangeMs`
+export function lodLevel(manifest, rangeMs, width, pixelsPerPoint = 2) {
+    const levels = manifest.levels.filter(level => level.retain === null || level.retain * level.bucket_ms >= rangeMs);
+    let chosen = levels[0];
+    for(const level of levels) {
+        if(rangeMs / level.bucket_ms >= width / pixelsPerPoint) {
+            chosen = level;
+        }
+    }
+    return chosen;
+}
 
-                results.push({
+// "series" holds players and impact, "planets" the liberation of every planet, see FILES in stats/lod.py
+export async function loadLodLevel(root, level, group = "series") {
+    return aggregateArrays(await fetch(root + level.paths[group]).then(r => r.arrayBuffer()));
+}
+
+// Rows shaped like aggregates.json holding only `planetIdx`, from the history shards covering `since` onwards
+export async function loadPlanetHistory(root, manifest, planetIdx, since) {
+    const shards = (manifest.planets[planetIdx] ?? []).filter(s => s.start + manifest.bucket_ms > since);
+    const loaded = await Promise.all(shards.map(s => fetch(root + s.path).then(r => r.json())));
+    const rows = [];
+    for(const shard of loaded) {
+        for(let i = 0; i < shard.timestamp.length; i++) {
+            rows.push({
+                timestamp: shard.timestamp[i],
+                attacks: {[planetIdx]: {players: shard.players[i], liberation: shard.liberation[i]}},
+            });
+        }
+    }
+    return rows;
+}
+
+// Tasks of the Major Order `id` with their progress and projected completion, precomputed in major_orders.json by stats/assignments.py
+export function getMajorOrderDetails(majorOrders, id, planets, lang){
+    const assignment = majorOrders.assignments.find(x => x.id === id);
+    if(assignment === undefined){
+        return [];
+    }
+    return assignment.tasks.map(task => {
+        const outlook = task.completes === false ? ", not on track"
+            : task.projected !== null && task.completes ? `, done by ${new Date(task.projected).toLocaleString()}` : "";
+        if(task.target === undefined){
+            // Types stats/assignments.py does not know, or without the values their type needs
+            return {
+                type: MajorOrderTypes[task.type] ?? `Type ${task.type}`,
+                progress: task.progress,
+                completes: task.completes,
+                status: `${task.progress}`
+            };
+        }
+        switch (task.type) {
+            case 3:
+            case 7:
+                return {
                     type: MajorOrderTypes[task.type],
-                    progress: progress,
-                    percent: value,
-                    target: target,
-                    faction: task.values[1],
-                    status: `${progress} / ${target}`
-                });
-                break;
-            }
+                    percent: task.percent,
+                    target: task.target,
+                    faction: task.faction,
+                    projected: task.projected,
+                    completes: task.completes,
+                    // No percent when the target is 0
+                    status: `${task.progress} / ${task.target}${task.percent !== null ? ` (${task.percent.toFixed(2)}%)` : ""}${outlook}`
+                };
+            case 12:
+                return {
+                    type: MajorOrderTypes[task.type],
+                    progress: task.progress,
+                    percent: task.percent,
+                    target: task.target,
+                    faction: task.faction,
+                    projected: task.projected,
+                    completes: task.completes,
+                    status: `${task.progress} / ${task.target}${outlook}`
+                };
             case 11:
-            case 13:
-            default: {
-                const planetIndex = task.values[2];
-                const percent = planets[planetIndex].liberation;
-                results.push({
+            case 13: {
+                const planet = planets[task.planet];
+                const percent = task.percent ?? planet?.liberation;
+                return {
                     type: MajorOrderTypes[task.type],
                     percent: percent,
-                    target: 100,
-                    faction: planets[planetIndex].faction,
-                    status: `${planets[planetIndex].name[lang]} ${percent.toFixed(2)}%`
-                });
+                    target: task.target,
+                    faction: planet?.faction,
+                    projected: task.projected,
+                    completes: task.completes,
+                    status: `${planet?.name[lang] ?? task.planet} ${percent != null ? `${percent.toFixed(2)}%` : ""}${outlook}`
+                };
             }
         }
-    }
-    return results;
+    });
 }
 
 export function twoDayPlanetAttack(width, agg, planetIdx, currentStatus, lang){
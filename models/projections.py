@@ -0,0 +1,112 @@
+"""
+Partial views of `801_full_v1.json` (or its cached form) for stages that only read a few fields.
+
+Fields that a view leaves out are skipped while parsing instead of being validated into models.
+Field names and aliases match `models.v1`, so every view can be decoded from the same payload.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Optional, Type
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from models import v1
+
+
+class EventMetrics(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: Optional[int] = None
+    event_type: Optional[int] = Field(None, alias='eventType')
+    faction: Optional[str] = None
+    health: Optional[int] = None
+    max_health: Optional[int] = Field(None, alias="maxHealth")
+    start_time: Optional[datetime] = Field(None, alias='startTime')
+    end_time: Optional[datetime] = Field(None, alias='endTime')
+    joint_operation_ids: Optional[List[int]] = Field(None, alias='jointOperationIds')
+
+    @property
+    def liberation(self) -> float:
+        # Same as frontend.Defense.liberation
+        return 100.0 - ((self.health / self.max_health) * 100)
+
+
+class StatisticsMetrics(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    player_count: Optional[int] = Field(None, alias='playerCount')
+
+
+class PlanetMetrics(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    index: int
+    max_health: int = Field(alias='maxHealth')
+    health: int
+    initial_owner: Optional[str] = Field(None, alias='initialOwner')
+    current_owner: str = Field(alias='currentOwner')
+    regen_per_second: float = Field(None, alias='regenPerSecond')
+    event: Optional[EventMetrics] = None
+    statistics: Optional[StatisticsMetrics] = None
+
+    @property
+    def liberation(self) -> float:
+        # Same as frontend.Planet.liberation
+        if self.current_owner == "Humans":
+            return (self.health / self.max_health) * 100
+        else:
+            return 100.0 - ((self.health / self.max_health) * 100)
+
+
+class CampaignPlanet(BaseModel):
+    index: int
+
+
+class CampaignMetrics(BaseModel):
+    id: Optional[int] = None
+    planet: CampaignPlanet
+
+
+class TaskMetrics(BaseModel):
+    type: Optional[int] = None
+    values: Optional[List[int]] = None
+
+
+class AssignmentMetrics(BaseModel):
+    id: int
+    tasks: Optional[List[TaskMetrics]] = None
+    progress: List[int]
+    expiration: datetime
+
+
+class WarMetrics(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    impact_multiplier: Optional[float] = Field(None, alias='impactMultiplier')
+
+
+class PlanetMetricsStatus(BaseModel):
+    """
+    Planet health, ownership, players and events, the war's impact multiplier, which planets have campaigns
+    and the progress of Major Orders.
+    """
+
+    war: WarMetrics
+    planets: List[PlanetMetrics]
+    campaigns: List[CampaignMetrics]
+    assignments: List[AssignmentMetrics]
+    snapshot_at: Optional[datetime] = None
+    version: Optional[int] = None
+
+    @property
+    def snapshot_ms(self) -> int:
+        # Same as frontend.CurrentStatus.snapshot_at
+        return int(self.snapshot_at.timestamp()*1000)
+
+
+PROJECTIONS: Dict[str, Type[BaseModel]] = {
+    'full': v1.FullStatus,
+    'planet-metrics': PlanetMetricsStatus,
+}
@@ -0,0 +1,55 @@
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from stats.columns import PlanetColumns
+
+
+def player_totals(columns: PlanetColumns) -> np.ndarray:
+    return columns.players.sum(axis=1)
+
+
+def campaign_planets(columns: PlanetColumns, step=-1) -> List[int]:
+    """Planets with a campaign in snapshot `step`, in the order the snapshot lists the campaigns."""
+    positions = columns.campaign[step]
+    planets = np.flatnonzero(positions >= 0)
+    return planets[np.argsort(positions[planets], kind='stable')].tolist()
+
+
+def recent_player_sums(columns: PlanetColumns, planets: Iterable[int], recency) -> Dict[int, int]:
+    """Players summed over the snapshots after the last `recency`-th one, keyed by planet in the order given."""
+    start = max(len(columns) - recency + 1, 0)
+    sums = columns.players[start:].sum(axis=0)
+    return {p: int(sums[p]) for p in planets}
+
+
+def attack_matrix(columns: PlanetColumns, planets: Iterable[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Planet order, shown mask, players and liberation as [snapshot, position in order] arrays for `attack_history`."""
+    tracked = np.array(sorted(planets), dtype=np.int64)
+    has_event = ~np.isnan(columns.event_liberation)
+    defended = np.setdiff1d(np.flatnonzero(has_event.any(axis=0)), tracked)
+    order = np.concatenate([tracked, defended])
+
+    shown = np.concatenate([columns.present[:, tracked], has_event[:, defended]], axis=1)
+    liberation = columns.progress()[:, order]
+    return order, shown, columns.players[:, order], liberation
+
+
+def rows(columns: PlanetColumns, planets: Iterable[int]) -> Iterator[dict]:
+    """The rows of aggregates.json, time, total players, impact multiplier and `attack_history` per snapshot, one at a time."""
+    for timestamp, players, impact, attacks in zip(columns.timestamp.tolist(), player_totals(columns).tolist(), columns.impact.tolist(),
+                                                   attack_history(columns, planets)):
+        yield {'timestamp': timestamp, 'players': players, 'impact': impact, 'attacks': attacks}
+
+
+def attack_history(columns: PlanetColumns, planets: Iterable[int]) -> Iterator[Dict[int, dict]]:
+    """Players and liberation per snapshot for `planets` and for any planet with a defense running.
+
+    Each snapshot lists the tracked planets it contains, then defended planets that are not tracked, each by planet index.
+    A defense replaces the planet's liberation with the defense progress.
+    Snapshots are produced one at a time so only the one being encoded exists as Python objects."""
+    order, shown, players, liberation = attack_matrix(columns, planets)
+    keys = order.tolist()
+    for step in range(len(columns)):
+        yield {key: {'players': p, 'liberation': lib}
+               for key, show, p, lib in zip(keys, shown[step].tolist(), players[step].tolist(), liberation[step].tolist()) if show}
@@ -0,0 +1,118 @@
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.projections import AssignmentMetrics
+from stats.rolling import HOUR_MS
+
+ASSIGNMENTS_VERSION = 1
+
+# Progress rates are measured over this much of the newest history
+RATE_WINDOW_MS = 24 * HOUR_MS
+# Assignments are forgotten this long after they expire
+RETAIN_MS = 30 * 24 * HOUR_MS
+# Task types counting towards a target, and where in the task values the target and faction are.
+# Same as getMajorOrderDetails in docs/components/planet_history.js used to do
+COUNTED = {3: (2, 0), 7: (2, 0), 12: (0, 1)}
+# Task types about one planet, their progress is 1 once it is done
+PLANET_TASKS = {11, 13}
+PLANET_VALUE = 2
+
+
+class AssignmentHistory:
+    """Progress of every Major Order over time keyed by assignment id.
+
+    A step is only stored when the progress changed, along with when the assignment was last seen."""
+
+    def __init__(self):
+        self.assignments: Dict[int, dict] = {}
+
+    def update(self, timestamp, assignments: List[AssignmentMetrics]):
+        """Adds the assignments of one snapshot, skipping those already seen in a snapshot as new or newer."""
+        for assignment in assignments:
+            entry = self.assignments.setdefault(assignment.id, {'seen': -1, 'timestamp': [], 'progress': []})
+            if timestamp <= entry['seen']:
+                continue
+            entry['seen'] = timestamp
+            entry['expiration'] = int(assignment.expiration.timestamp()*1000)
+            entry['tasks'] = [{'type': task.type, 'values': task.values or []} for task in assignment.tasks or []]
+            if not entry['progress'] or entry['progress'][-1] != assignment.progress:
+                entry['timestamp'].append(timestamp)
+                entry['progress'].append(list(assignment.progress))
+        if any(entry['expiration'] < timestamp - RETAIN_MS for entry in self.assignments.values()):
+            self.assignments = {id: entry for id, entry in self.assignments.items() if entry['expiration'] >= timestamp - RETAIN_MS}
+
+    def current(self) -> List[int]:
+        """Ids of the assignments in the newest snapshot."""
+        if not self.assignments:
+            return []
+        newest = max(entry['seen'] for entry in self.assignments.values())
+        return [id for id, entry in self.assignments.items() if entry['seen'] == newest]
+
+    def rate(self, id, task) -> Optional[float]:
+        """Progress per hour of task number `task` over the last `RATE_WINDOW_MS`, None without two steps to compare."""
+        entry = self.assignments[id]
+        timestamps = entry['timestamp']
+        # The last step before the window still holds the progress at its start
+        first = max(np.searchsorted(timestamps, entry['seen'] - RATE_WINDOW_MS, side='right') - 1, 0)
+        hours = (entry['seen'] - timestamps[first]) / HOUR_MS
+        if hours <= 0 or len(entry['progress'][first]) <= task:
+            return None
+        return (entry['progress'][-1][task] - entry['progress'][first][task]) / hours
+
+    def summary(self, liberation, forecasts) -> dict:
+        """Progress, rate and projected completion of every task of the current assignments.
+
+        Planet tasks use the planet's `liberation` (the defense progress where a defense runs, as `PlanetColumns.progress`),
+        and its liberation rate and ETA in `forecasts` (from `stats.forecast`) over the longest window.
+        Tasks of other types, or without the values their type needs, only get their progress."""
+        eta, velocity = {}, {}
+        if forecasts['windows']:
+            eta = dict(zip(forecasts['planets'], forecasts['eta'][-1]))
+            velocity = dict(zip(forecasts['planets'], forecasts['velocity'][-1]))
+        out = []
+        for id in self.current():
+            entry = self.assignments[id]
+            tasks = []
+            for position, task in enumerate(entry['tasks']):
+                progress = entry['progress'][-1][position] if position < len(entry['progress'][-1]) else 0
+                details = {'type': task['type'], 'progress': progress}
+                values = task['values']
+                if task['type'] in COUNTED and len(values) > max(COUNTED[task['type']]):
+                    target_value, faction_value = COUNTED[task['type']]
+                    target = values[target_value]
+                    rate = self.rate(id, position)
+                    projected = None
+                    if rate is not None and rate > 0 and progress < target:
+                        projected = int(entry['seen'] + (target - progress) / rate * HOUR_MS)
+                    details.update(target=target, faction=values[faction_value], percent=round(progress / target * 100, 4) if target else None,
+                                   rate=None if rate is None else round(rate, 4), projected=projected)
+                    done, known = progress >= target, rate is not None
+                elif task['type'] in PLANET_TASKS and len(values) > PLANET_VALUE:
+                    planet = values[PLANET_VALUE]
+                    percent = liberation[planet] if planet < len(liberation) else np.nan
+                    projected = eta.get(planet)
+                    details.update(target=100, planet=planet, percent=None if np.isnan(percent) else round(float(percent), 4),
+                                   rate=velocity.get(planet), projected=projected)
+                    done, known = progress >= 1, velocity.get(planet) is not None
+                else:
+                    done, known = False, False
+                if done:
+                    details.update(projected=None, completes=True)
+                elif not known:
+                    details['completes'] = None
+                else:
+                    details['completes'] = projected is not None and projected <= entry['expiration']
+                tasks.append(details)
+            out.append({'id': id, 'expiration': entry['expiration'], 'seen': entry['seen'], 'tasks': tasks})
+        return {'version': ASSIGNMENTS_VERSION, 'assignments': out}
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'assignments.history': np.array(json.dumps(self.assignments))}
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'AssignmentHistory':
+        history = cls()
+        history.assignments = {int(id): entry for id, entry in json.loads(str(arrays['assignments.history'])).items()}
+        return history
@@ -0,0 +1,94 @@
+from typing import Dict, List
+
+import numpy as np
+
+from stats.columns import PlanetColumns
+
+CHANGES_VERSION = 1
+
+# Planet columns compared between adjacent snapshots, -1 is "none" in all of them
+TRACKED = ['owner', 'initial_owner', 'event', 'campaign']
+# Owner changes hold owner codes, event changes the event id, campaign changes -1 on both sides
+KINDS = ['owner', 'initial_owner', 'event_start', 'event_end', 'campaign_enter', 'campaign_leave']
+LOG_DTYPES = {'timestamp': np.int64, 'planet': np.int16, 'kind': np.int8, 'before': np.int64, 'after': np.int64}
+
+
+def diff(before: Dict[str, np.ndarray], after: Dict[str, np.ndarray], present) -> List[tuple]:
+    """Changes from `before` to `after` where `present`, as (kind, mask, value before, value after) for every kind."""
+    changed = {name: present & (before[name] != after[name]) for name in TRACKED}
+    none = np.full_like(before['campaign'], -1, dtype=np.int64)
+    return [
+        ('owner', changed['owner'], before['owner'], after['owner']),
+        ('initial_owner', changed['initial_owner'], before['initial_owner'], after['initial_owner']),
+        ('event_end', changed['event'] & (before['event'] != -1), before['event'], none),
+        ('event_start', changed['event'] & (after['event'] != -1), none, after['event']),
+        ('campaign_enter', changed['campaign'] & (before['campaign'] == -1), none, none),
+        ('campaign_leave', changed['campaign'] & (after['campaign'] == -1), none, none),
+    ]
+
+
+class ChangeLog:
+    """Owner, initial owner, event and campaign changes between adjacent snapshots, oldest first.
+
+    Only the planet state of the newest snapshot is kept to diff against, so each new snapshot costs the same
+    however long the log is, and the log keeps growing after snapshots leave the build window."""
+
+    def __init__(self):
+        self.log = {name: np.zeros(0, dtype=dtype) for name, dtype in LOG_DTYPES.items()}
+        self.last = {name: np.zeros(0, dtype=np.int64) for name in TRACKED}
+        self.last_present = np.zeros(0, dtype=np.bool_)
+        self.last_timestamp = np.int64(-1)
+
+    def __len__(self):
+        return len(self.log['timestamp'])
+
+    def update(self, columns: PlanetColumns, rows):
+        """Appends the changes in `rows` of `columns` (snapshots not seen before), skipping any older than the newest seen."""
+        rows = columns.ordered(rows, after=self.last_timestamp)
+        if len(rows) == 0:
+            return
+        width = max(columns.planet_count, len(self.last_present))
+        present = np.zeros((len(rows) + 1, width), dtype=np.bool_)
+        present[0, :len(self.last_present)] = self.last_present
+        present[1:, :columns.planet_count] = columns.present[rows]
+        values = {}
+        for name in TRACKED:
+            values[name] = np.full((len(rows) + 1, width), -1, dtype=np.int64)
+            values[name][0, :len(self.last[name])] = self.last[name]
+            values[name][1:, :columns.planet_count] = getattr(columns, name)[rows]
+
+        timestamps = columns.timestamp[rows]
+        parts = {name: [] for name in LOG_DTYPES}
+        for kind, mask, before, after in diff({name: v[:-1] for name, v in values.items()}, {name: v[1:] for name, v in values.items()},
+                                              present[:-1] & present[1:]):
+            snapshot, planet = np.nonzero(mask)
+            parts['timestamp'].append(timestamps[snapshot])
+            parts['planet'].append(planet)
+            parts['kind'].append(np.full(len(planet), KINDS.index(kind)))
+            parts['before'].append(before[snapshot, planet])
+            parts['after'].append(after[snapshot, planet])
+        new = {name: np.concatenate(arrays).astype(LOG_DTYPES[name]) for name, arrays in parts.items()}
+        order = np.lexsort((new['kind'], new['planet'], new['timestamp']))
+        self.log = {name: np.concatenate([self.log[name], new[name][order]]) for name in LOG_DTYPES}
+
+        self.last = {name: v[-1] for name, v in values.items()}
+        self.last_present = present[-1]
+        self.last_timestamp = timestamps[-1]
+
+    def to_json(self, owners) -> dict:
+        return {'version': CHANGES_VERSION, 'kinds': KINDS, 'owners': list(owners),
+                **{name: values.tolist() for name, values in self.log.items()}}
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {f'changes.log.{name}': values for name, values in self.log.items()}
+        arrays.update({f'changes.last.{name}': values for name, values in self.last.items()})
+        return dict(arrays, **{'changes.last.present': self.last_present, 'changes.last.timestamp': np.array(self.last_timestamp)})
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'ChangeLog':
+        changes = cls()
+        changes.log = {name: arrays[f'changes.log.{name}'] for name in LOG_DTYPES}
+        changes.last = {name: arrays[f'changes.last.{name}'] for name in TRACKED}
+        changes.last_present = arrays['changes.last.present']
+        changes.last_timestamp = arrays['changes.last.timestamp'][()]
+        return changes
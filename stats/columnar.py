@@ -0,0 +1,93 @@
+import json
+import struct
+from typing import Iterable
+
+import numpy as np
+
+from stats import aggregate
+from stats.columns import PlanetColumns
+
+COLUMNAR_VERSION = 1
+
+MAGIC = b'HDAG'
+# magic, format version, header length
+BINARY_PREAMBLE = struct.Struct('<4sII')
+# Little endian so the arrays can be viewed in place as JS typed arrays
+BINARY_DTYPES = {
+    'timestamp': '<f8',
+    'players': '<i4',
+    'impact': '<f4',
+    'planets': '<i4',
+    # [planet, snapshot], players is 0 and liberation NaN where the planet is not shown
+    'attack_players': '<i4',
+    'attack_liberation': '<f4',
+}
+# Typed array offsets must be a multiple of their element size
+ALIGNMENT = 8
+
+
+def aggregate_arrays(columns: PlanetColumns, planets: Iterable[int]):
+    """The history in aggregates.json as one array per metric, the attack metrics as [planet, snapshot] arrays."""
+    order, shown, players, liberation = aggregate.attack_matrix(columns, planets)
+    return {
+        'timestamp': columns.timestamp,
+        'players': aggregate.player_totals(columns),
+        'impact': columns.impact,
+        'planets': order,
+        'shown': shown.T,
+        'attack_players': np.where(shown, players, 0).T,
+        'attack_liberation': np.where(shown, liberation, np.nan).T,
+    }
+
+
+def to_json(arrays) -> dict:
+    """Parallel arrays per metric, planet indexes listed once and null where a planet is not shown."""
+    def masked(values, shown):
+        return [value if show else None for value, show in zip(values.tolist(), shown.tolist())]
+
+    return {
+        'version': COLUMNAR_VERSION,
+        'timestamp': arrays['timestamp'].tolist(),
+        'players': arrays['players'].tolist(),
+        'impact': arrays['impact'].tolist(),
+        'planets': arrays['planets'].tolist(),
+        'attacks': {
+            'players': [masked(values, shown) for values, shown in zip(arrays['attack_players'], arrays['shown'])],
+            'liberation': [masked(values, shown) for values, shown in zip(arrays['attack_liberation'], arrays['shown'])],
+        },
+    }
+
+
+def to_binary(arrays, dtypes=BINARY_DTYPES) -> bytes:
+    """Preamble, JSON header describing each array in `dtypes` as [dtype, byte offset, shape], then the arrays.
+
+    Offsets are from the start of the data and aligned, so every array can be used as a typed array without copying."""
+    encoded = {name: np.ascontiguousarray(arrays[name], dtype=dtype) for name, dtype in dtypes.items()}
+    layout = {}
+    offset = 0
+    for name, values in encoded.items():
+        layout[name] = [dtypes[name], offset, list(values.shape)]
+        offset += _padded(values.nbytes)
+    header = json.dumps({'version': COLUMNAR_VERSION, 'arrays': layout}).encode()
+    header += b' ' * (_padded(BINARY_PREAMBLE.size + len(header)) - BINARY_PREAMBLE.size - len(header))
+
+    out = bytearray(BINARY_PREAMBLE.pack(MAGIC, COLUMNAR_VERSION, len(header)))
+    out += header
+    for values in encoded.values():
+        data = values.tobytes()
+        out += data + bytes(_padded(len(data)) - len(data))
+    return bytes(out)
+
+
+def from_binary(data: bytes):
+    magic, version, header_length = BINARY_PREAMBLE.unpack_from(data)
+    if magic != MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError(f"Not a v{COLUMNAR_VERSION} aggregates file")
+    start = BINARY_PREAMBLE.size + header_length
+    header = json.loads(data[BINARY_PREAMBLE.size:start])
+    return {name: np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=start + offset).reshape(shape)
+            for name, (dtype, offset, shape) in header['arrays'].items()}
+
+
+def _padded(length):
+    return -(-length // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,156 @@
+from typing import Dict
+
+import numpy as np
+
+from models.projections import PlanetMetricsStatus
+from stats.gitobjects import SnapshotRef
+
+# Owner codes, more are added as they show up
+OWNERS = ['Humans', 'Terminids', 'Automaton', 'Illuminate']
+
+# (snapshot x planet index) arrays and the value used where a planet is missing from a snapshot
+PLANET_METRICS = {
+    'present': (np.bool_, False),
+    'health': (np.int64, 0),
+    'max_health': (np.int64, 0),
+    'players': (np.int64, 0),
+    'owner': (np.int8, -1),
+    'initial_owner': (np.int8, -1),
+    'regen_per_second': (np.float64, np.nan),
+    'liberation': (np.float64, np.nan),
+    # Defense progress, NaN when there is no event on the planet
+    'event_liberation': (np.float64, np.nan),
+    # Id of the event on the planet, -1 when there is none
+    'event': (np.int64, -1),
+    # End of that event in ms since the epoch
+    'event_end': (np.int64, -1),
+    # Position of the planet in the snapshot's campaign list, -1 when not under attack
+    'campaign': (np.int16, -1),
+}
+
+# One value per snapshot
+SNAPSHOT_METRICS = {
+    'timestamp': np.int64,
+    'impact': np.float64,
+    'commit': '<U40',
+    'blob': '<U40',
+}
+
+
+class PlanetColumns:
+    """Planet metrics of every snapshot as dense arrays indexed by [snapshot, planet index], oldest snapshot first.
+
+    Rows are written straight into preallocated arrays that grow geometrically, so appending one snapshot at a time
+    costs the same as appending them all at once and nothing but the arrays is kept around."""
+
+    def __init__(self, planet_count=0):
+        self.owners = list(OWNERS)
+        self.count = 0
+        self.buffers: Dict[str, np.ndarray] = {}
+        for name, (dtype, fill) in PLANET_METRICS.items():
+            self.buffers[name] = np.full((0, planet_count), fill, dtype=dtype)
+        for name, dtype in SNAPSHOT_METRICS.items():
+            self.buffers[name] = np.zeros(0, dtype=dtype)
+
+    def __len__(self):
+        return self.count
+
+    def __getattr__(self, name):
+        if name in PLANET_METRICS or name in SNAPSHOT_METRICS:
+            return self.buffers[name][:self.count]
+        raise AttributeError(name)
+
+    @property
+    def planet_count(self):
+        return self.buffers['present'].shape[1]
+
+    def progress(self, rows=slice(None)) -> np.ndarray:
+        """Liberation of `rows`, a running defense replaces it with the defense progress as in aggregates.json."""
+        event_liberation = self.event_liberation[rows]
+        return np.where(np.isnan(event_liberation), self.liberation[rows], event_liberation)
+
+    def ordered(self, rows, after=None) -> np.ndarray:
+        """Indexes of `rows` (a boolean mask or index array) in time order, leaving out snapshots at or before `after`."""
+        rows = np.asarray(rows)
+        if rows.dtype == np.bool_:
+            rows = np.flatnonzero(rows)
+        rows = rows[np.argsort(self.timestamp[rows], kind='stable')]
+        return rows if after is None else rows[self.timestamp[rows] > after]
+
+    def owner_code(self, owner):
+        if owner not in self.owners:
+            self.owners.append(owner)
+        return self.owners.index(owner)
+
+    def _reserve(self, width):
+        capacity, current_width = self.buffers['present'].shape
+        if self.count < capacity and width <= current_width:
+            return
+        capacity = max(capacity, 2 * self.count, 16)
+        width = max(width, current_width)
+        for name, (dtype, fill) in PLANET_METRICS.items():
+            grown = np.full((capacity, width), fill, dtype=dtype)
+            grown[:self.count, :current_width] = self.buffers[name][:self.count]
+            self.buffers[name] = grown
+        for name, dtype in SNAPSHOT_METRICS.items():
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:self.count] = self.buffers[name][:self.count]
+            self.buffers[name] = grown
+
+    def append(self, snapshot: SnapshotRef, record: PlanetMetricsStatus):
+        planets = record.planets
+        index = [p.index for p in planets]
+        self._reserve(max(index, default=-1) + 1)
+        row = self.count
+        for name, (dtype, fill) in PLANET_METRICS.items():
+            self.buffers[name][row] = fill
+
+        self.buffers['present'][row, index] = True
+        self.buffers['health'][row, index] = [p.health for p in planets]
+        self.buffers['max_health'][row, index] = [p.max_health for p in planets]
+        self.buffers['players'][row, index] = [p.statistics.player_count for p in planets]
+        self.buffers['owner'][row, index] = [self.owner_code(p.current_owner) for p in planets]
+        self.buffers['initial_owner'][row, index] = [-1 if p.initial_owner is None else self.owner_code(p.initial_owner) for p in planets]
+        self.buffers['regen_per_second'][row, index] = [p.regen_per_second for p in planets]
+        self.buffers['liberation'][row, index] = [p.liberation for p in planets]
+        events = [p for p in planets if p.event is not None]
+        self.buffers['event_liberation'][row, [p.index for p in events]] = [p.event.liberation for p in events]
+        self.buffers['event'][row, [p.index for p in events]] = [-1 if p.event.id is None else p.event.id for p in events]
+        self.buffers['event_end'][row, [p.index for p in events]] = [-1 if p.event.end_time is None else int(p.event.end_time.timestamp()*1000) for p in events]
+        campaign = {}
+        for position, c in enumerate(record.campaigns):
+            campaign.setdefault(c.planet.index, position)
+        self.buffers['campaign'][row, list(campaign.keys())] = list(campaign.values())
+
+        self.buffers['timestamp'][row] = record.snapshot_ms
+        self.buffers['impact'][row] = record.war.impact_multiplier
+        self.buffers['commit'][row] = snapshot.commit
+        self.buffers['blob'][row] = snapshot.blob or ''
+        self.count += 1
+
+    def select(self, rows):
+        """Keeps only `rows` (a boolean mask or index array), in that order."""
+        for name, values in self.buffers.items():
+            self.buffers[name] = values[:self.count][rows]
+        self.count = len(self.buffers['timestamp'])
+
+    def sort(self):
+        self.select(np.argsort(self.timestamp, kind='stable'))
+
+    def repeated(self, times) -> 'PlanetColumns':
+        """The history `times` over, one copy after the other, to benchmark longer histories."""
+        return PlanetColumns.from_arrays({name: values if name == 'owners' else np.concatenate([values] * times)
+                                          for name, values in self.to_arrays().items()})
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {name: values[:self.count] for name, values in self.buffers.items()}
+        return dict(arrays, owners=np.array(self.owners))
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'PlanetColumns':
+        columns = cls()
+        columns.owners = arrays['owners'].tolist()
+        for name in list(PLANET_METRICS) + list(SNAPSHOT_METRICS):
+            columns.buffers[name] = arrays[name]
+        columns.count = len(columns.buffers['timestamp'])
+        return columns
@@ -0,0 +1,108 @@
+import json
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from models.projections import EventMetrics
+from stats.rolling import HOUR_MS
+
+DEFENSES_VERSION = 1
+
+# Besides the first, one health point is kept per bucket of this length, the newest one seen in it
+TRAJECTORY_BUCKET_MS = HOUR_MS
+# Success rates in defenses.json cover this much of the newest history
+SUMMARY_MS = 30 * 24 * HOUR_MS
+
+
+def ms(when) -> Optional[int]:
+    return None if when is None else int(when.timestamp()*1000)
+
+
+class DefenseIndex:
+    """Every event seen on a planet keyed by event id, with its health over time and how it ended.
+
+    An event ends in the first snapshot where its planet has no event or another one: it was won if the planet
+    is still owned by Humans then and lost otherwise. Only the events still running are looked at for each new
+    snapshot, so the index grows without its history being read again."""
+
+    def __init__(self):
+        self.events: Dict[int, dict] = {}
+        # Ids of the events without an outcome
+        self.running: Set[int] = set()
+        self.last_timestamp = -1
+
+    def update(self, timestamp, events: List[Tuple[int, EventMetrics]], owner: np.ndarray, owners: List[str]):
+        """Adds the (planet index, event) pairs of one snapshot, skipping it unless it is newer than the newest seen.
+
+        `owner` holds the snapshot's owner code per planet index and `owners` maps the codes to names."""
+        if timestamp <= self.last_timestamp:
+            return
+        seen = set()
+        for planet, event in events:
+            if event.id is None:
+                continue
+            seen.add(event.id)
+            self._observe(timestamp, planet, event)
+        for id in sorted(self.running - seen):
+            entry = self.events[id]
+            if entry['planet'] >= len(owner) or owner[entry['planet']] < 0:
+                continue
+            entry['ended'] = timestamp
+            entry['outcome'] = 'won' if owners[owner[entry['planet']]] == 'Humans' else 'lost'
+            self.running.discard(id)
+        self.last_timestamp = timestamp
+
+    def _observe(self, timestamp, planet, event: EventMetrics):
+        entry = self.events.get(event.id)
+        if entry is None:
+            entry = self.events[event.id] = {'id': event.id, 'planet': planet, 'event_type': event.event_type, 'faction': event.faction,
+                                             'first_seen': timestamp, 'ended': None, 'outcome': None, 'trajectory': []}
+        # Seen again after its planet went without it, so it had not ended after all
+        entry.update(ended=None, outcome=None)
+        self.running.add(event.id)
+        entry.update(start=ms(event.start_time), end=ms(event.end_time), max_health=event.max_health,
+                     joint_operations=event.joint_operation_ids or [], last_seen=timestamp)
+        if event.health is None or not event.max_health:
+            return
+        point = [timestamp, round(event.liberation, 2)]
+        trajectory = entry['trajectory']
+        if trajectory and trajectory[-1][0] // TRAJECTORY_BUCKET_MS == timestamp // TRAJECTORY_BUCKET_MS and len(trajectory) > 1:
+            trajectory[-1] = point
+        else:
+            trajectory.append(point)
+
+    def query(self, faction=None, since=None, until=None) -> List[dict]:
+        """Events against `faction` that started between `since` and `until` (ms since the epoch), oldest first."""
+        def start(entry):
+            return entry['start'] if entry['start'] is not None else entry['first_seen']
+
+        found = [entry for entry in self.events.values()
+                 if (faction is None or entry['faction'] == faction)
+                 and (since is None or start(entry) >= since) and (until is None or start(entry) < until)]
+        return sorted(found, key=lambda entry: (start(entry), entry['id']))
+
+    def summary(self, since) -> Dict[str, dict]:
+        """Won, lost and running events per faction since `since`, with the share of finished ones that were won."""
+        out = {}
+        for entry in self.query(since=since):
+            counts = out.setdefault(entry['faction'], {'won': 0, 'lost': 0, 'running': 0})
+            counts[entry['outcome'] or 'running'] += 1
+        for counts in out.values():
+            finished = counts['won'] + counts['lost']
+            counts['success_rate'] = round(counts['won'] / finished, 4) if finished else None
+        return out
+
+    def to_json(self) -> dict:
+        return {'version': DEFENSES_VERSION, 'summary': self.summary(self.last_timestamp - SUMMARY_MS), 'events': self.query()}
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'defenses.index': np.array(json.dumps({'last_timestamp': self.last_timestamp, 'events': list(self.events.values())}))}
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'DefenseIndex':
+        index = cls()
+        state = json.loads(str(arrays['defenses.index']))
+        index.last_timestamp = state['last_timestamp']
+        index.events = {entry['id']: entry for entry in state['events']}
+        index.running = {id for id, entry in index.events.items() if entry['outcome'] is None}
+        return index
@@ -0,0 +1,61 @@
+from typing import List
+
+import numpy as np
+
+from stats.columns import PlanetColumns
+from stats.rolling import HOUR_MS, WINDOWS, Window
+
+FORECAST_VERSION = 1
+
+
+def _rounded(values, digits):
+    return [None if not np.isfinite(value) else round(float(value), digits) for value in values]
+
+
+def forecast(columns: PlanetColumns, windows: List[Window] = WINDOWS) -> dict:
+    """Liberation rate and ETA of every planet with a campaign or defense in the newest snapshot, for each window.
+
+    Rates are in percent per hour from the progress between the newest snapshot and the one `window.snapshots` before it.
+    Defenses use the event's progress (see `PlanetColumns.progress`) and are checked against its end time.
+    Only the newest snapshot and one per window are read, so the cost does not grow with the history. The rate is null where the owner or event changed within the window."""
+    if len(columns) == 0:
+        return {'version': FORECAST_VERSION, 'timestamp': None, 'windows': [], 'planets': []}
+    last = len(columns) - 1
+    planets = np.flatnonzero(columns.present[last] & ((columns.campaign[last] >= 0) | (columns.event[last] >= 0)))
+    now = columns.timestamp[last]
+    event = columns.event[last, planets]
+    defense = event >= 0
+    progress = columns.progress(last)[planets]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        regen = columns.regen_per_second[last, planets] * 3600 / columns.max_health[last, planets] * 100
+
+    out = {
+        'version': FORECAST_VERSION,
+        'timestamp': int(now),
+        'windows': [{'name': window.name, 'snapshots': window.snapshots} for window in windows],
+        'planets': planets.tolist(),
+        'defense': defense.tolist(),
+        'liberation': _rounded(progress, 4),
+        # Health regenerated per hour in percent, only slows down liberation campaigns
+        'regen': _rounded(np.where(defense, np.nan, regen), 4),
+        'deadline': [int(end) if end >= 0 else None for end in columns.event_end[last, planets]],
+        'velocity': [],
+        'eta': [],
+        'finishes': [],
+    }
+    for window in windows:
+        start = max(last - window.snapshots, 0)
+        hours = (now - columns.timestamp[start]) / HOUR_MS
+        start_progress = columns.progress(start)[planets]
+        same = (columns.present[start, planets] & (columns.owner[start, planets] == columns.owner[last, planets])
+                & (columns.event[start, planets] == event))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            velocity = np.where(same & (hours > 0), (progress - start_progress) / hours, np.nan)
+            eta = np.where(velocity > 0, now + (100.0 - progress) / velocity * HOUR_MS, np.nan)
+        deadline = columns.event_end[last, planets]
+        # Liberation campaigns have no deadline, defenses have to finish before the event ends
+        finishes = np.where(defense, eta <= deadline, np.isfinite(eta))
+        out['velocity'].append(_rounded(velocity, 4))
+        out['eta'].append([None if not np.isfinite(value) else int(value) for value in eta])
+        out['finishes'].append([None if not np.isfinite(v) else bool(f) for v, f in zip(velocity, finishes)])
+    return out
@@ -0,0 +1,86 @@
+import datetime
+import subprocess
+from typing import List, NamedTuple, Optional
+
+NULL_OID = '0' * 40
+
+
+class SnapshotRef(NamedTuple):
+    commit: str
+    snapshot_at: datetime.datetime
+    # None when the log could not tell us, e.g. for merge commits
+    blob: Optional[str]
+
+
+def log_snapshots(path, since=None, limit=None, cwd='.') -> List[SnapshotRef]:
+    """Every commit touching `path`, newest first, with its commit time and the blob id of `path` at that commit."""
+    args = ['git', 'log', '--format=%x00%H %ct', '--raw', '--no-abbrev', '--no-renames']
+    if limit is not None:
+        args.append(f'--max-count={limit}')
+    if since is not None:
+        args.append(f'{since}..HEAD')
+    args += ['--', path]
+    out = subprocess.check_output(args, cwd=cwd).decode()
+
+    refs: List[SnapshotRef] = []
+    for entry in out.split('\0')[1:]:
+        lines = entry.strip().splitlines()
+        commit, timestamp = lines[0].split()
+        blob = None
+        for line in lines[1:]:
+            # :<old mode> <new mode> <old blob> <new blob> <status>\t<path>
+            meta, _, name = line.partition('\t')
+            if name == path:
+                blob = meta.split()[3]
+        if blob == NULL_OID:
+            # The file was deleted in this commit
+            continue
+        refs.append(SnapshotRef(commit, datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone.utc), blob))
+    return refs
+
+
+class GitObjectReader:
+    """Reads objects through a single long-lived `git cat-file --batch` process."""
+
+    def __init__(self, cwd='.'):
+        self.proc = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, name) -> Optional[bytes]:
+        found = self.read_object(name)
+        return None if found is None else found[1]
+
+    def read_object(self, name):
+        """Returns (object id, contents) for any name git understands, such as `<commit>:<path>`."""
+        self.proc.stdin.write(name.encode() + b'\n')
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline()
+        if not header:
+            raise RuntimeError('git cat-file exited unexpectedly')
+        parts = header.split()
+        if parts[-1] == b'missing' or parts[-1] == b'ambiguous':
+            return None
+        oid, _, size = parts
+        data = self.proc.stdout.read(int(size))
+        # Every object is followed by a newline
+        self.proc.stdout.read(1)
+        return oid.decode(), data
+
+    def read_snapshot(self, ref: SnapshotRef, path):
+        """Returns (blob id, contents) of `path` as of `ref`."""
+        if ref.blob is not None:
+            return ref.blob, self.read(ref.blob)
+        found = self.read_object(f'{ref.commit}:{path}')
+        if found is None:
+            return None, None
+        return found
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
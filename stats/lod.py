@@ -0,0 +1,170 @@
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+from stats.columns import PlanetColumns
+
+LOD_VERSION = 2
+MINUTE_MS = 60 * 1000
+
+
+class Level(NamedTuple):
+    name: str
+    bucket_ms: int
+    # Buckets kept, None keeps everything
+    retain: Optional[int]
+
+
+LEVELS = [
+    Level('10m', 10 * MINUTE_MS, 1440),
+    Level('1h', 60 * MINUTE_MS, 24 * 30),
+    Level('6h', 6 * 60 * MINUTE_MS, 4 * 365),
+    Level('1d', 24 * 60 * MINUTE_MS, None),
+]
+
+# Metrics with one value per snapshot, then those with one value per snapshot and planet
+SERIES = ['players', 'impact']
+PLANET_SERIES = ['liberation']
+# Every level is written as one file per group of metrics, so a chart of the global series does not download every planet
+FILES = {'series': SERIES, 'planets': PLANET_SERIES}
+# Partial aggregates that can be combined, means are sum / count
+PARTS = ['min', 'max', 'sum', 'count']
+IDENTITY = {'min': np.inf, 'max': -np.inf, 'sum': 0.0, 'count': 0}
+# Written as float32 unless listed
+BINARY_DTYPES = {'start': '<f8', 'count': '<i4'}
+
+
+def snapshot_series(columns: PlanetColumns, rows) -> Dict[str, np.ndarray]:
+    """Values summarized by the pyramid for `rows` of `columns`, liberation is NaN where a planet is missing.
+
+    Liberation is the defense progress where a defense runs, see `PlanetColumns.progress`."""
+    return {
+        'players': columns.players[rows].sum(axis=1).astype(np.float64),
+        'impact': columns.impact[rows],
+        'liberation': columns.progress(rows),
+    }
+
+
+def summarize(timestamps, series, bucket_ms):
+    """Bucket starts and min/max/sum/count per bucket of snapshots sorted by time, ignoring NaN."""
+    buckets = timestamps // bucket_ms * bucket_ms
+    starts, firsts = np.unique(buckets, return_index=True)
+    parts = {}
+    for name, values in series.items():
+        missing = np.isnan(values)
+        parts[name] = {
+            'min': np.fmin.reduceat(values, firsts, axis=0),
+            'max': np.fmax.reduceat(values, firsts, axis=0),
+            'sum': np.add.reduceat(np.where(missing, 0.0, values), firsts, axis=0),
+            'count': np.add.reduceat(~missing, firsts, axis=0, dtype=np.int64),
+        }
+    return starts, parts
+
+
+class Pyramid:
+    """Downsampled history at every level in `LEVELS`, with min, max and mean per bucket.
+
+    Buckets hold combinable partial aggregates, so new snapshots are folded into the buckets they fall in
+    without revisiting older ones, and coarse levels keep their history after the snapshots leave the build window."""
+
+    def __init__(self):
+        self.levels: Dict[str, Dict[str, np.ndarray]] = {level.name: self._empty(0) for level in LEVELS}
+        self.last_timestamp = np.int64(-1)
+
+    @staticmethod
+    def _empty(width):
+        arrays = {'start': np.zeros(0, dtype=np.int64)}
+        for name in SERIES + PLANET_SERIES:
+            shape = (0, width) if name in PLANET_SERIES else (0,)
+            for part in PARTS:
+                arrays[f'{name}_{part}'] = np.full(shape, IDENTITY[part], dtype=np.int64 if part == 'count' else np.float64)
+        return arrays
+
+    def update(self, columns: PlanetColumns, rows):
+        """Folds `rows` of `columns` (snapshots not seen before) into every level, skipping any older than the newest seen."""
+        rows = columns.ordered(rows, after=self.last_timestamp)
+        if len(rows) == 0:
+            return
+        timestamps = columns.timestamp[rows]
+        series = snapshot_series(columns, rows)
+        for level in LEVELS:
+            starts, parts = summarize(timestamps, series, level.bucket_ms)
+            self._merge(level, starts, parts)
+        self.last_timestamp = timestamps[-1]
+
+    def _merge(self, level: Level, starts, parts):
+        old = self.levels[level.name]
+        width = max(old['liberation_min'].shape[1], parts['liberation']['min'].shape[1])
+        merged_starts = np.union1d(old['start'], starts)
+        merged = self._empty(width)
+        merged['start'] = merged_starts
+        for key, values in merged.items():
+            if key != 'start':
+                shape = (len(merged_starts),) + values.shape[1:]
+                merged[key] = np.full(shape, IDENTITY[key.rsplit('_', 1)[1]], dtype=values.dtype)
+
+        for source_starts, source in ((old['start'], None), (starts, parts)):
+            at = np.searchsorted(merged_starts, source_starts)
+            for name in SERIES + PLANET_SERIES:
+                for part in PARTS:
+                    key = f'{name}_{part}'
+                    values = old[key] if source is None else source[name][part]
+                    target = merged[key][at, :values.shape[1]] if name in PLANET_SERIES else merged[key][at]
+                    if part == 'min':
+                        combined = np.fmin(target, values)
+                    elif part == 'max':
+                        combined = np.fmax(target, values)
+                    else:
+                        combined = target + values
+                    if name in PLANET_SERIES:
+                        merged[key][at, :values.shape[1]] = combined
+                    else:
+                        merged[key][at] = combined
+
+        if level.retain is not None:
+            merged = {key: values[-level.retain:] for key, values in merged.items()}
+        self.levels[level.name] = merged
+
+    def level_arrays(self, name, metrics=SERIES + PLANET_SERIES) -> Dict[str, np.ndarray]:
+        """Bucket start, snapshot count and min/max/mean of each of `metrics` at level `name`, per planet metrics as [planet, bucket].
+
+        Min and max are NaN where a bucket has no value."""
+        level = self.levels[name]
+        out = {'start': level['start'], 'count': level['players_count']}
+        for metric in metrics:
+            count = level[f'{metric}_count']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = level[f'{metric}_sum'] / count
+            stats = {
+                'min': np.where(count > 0, level[f'{metric}_min'], np.nan),
+                'max': np.where(count > 0, level[f'{metric}_max'], np.nan),
+                'mean': np.where(count > 0, mean, np.nan),
+            }
+            for stat, values in stats.items():
+                out[f'{metric}_{stat}'] = values.T if metric in PLANET_SERIES else values
+        return out
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {f'lod.{level}.{key}': values for level, arrays in self.levels.items() for key, values in arrays.items()}
+        return dict(arrays, **{'lod.last_timestamp': np.array(self.last_timestamp)})
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'Pyramid':
+        pyramid = cls()
+        for level in LEVELS:
+            pyramid.levels[level.name] = {key: arrays[f'lod.{level.name}.{key}'] for key in pyramid.levels[level.name]}
+        pyramid.last_timestamp = arrays['lod.last_timestamp'][()]
+        return pyramid
+
+
+def binary_dtypes(arrays) -> Dict[str, str]:
+    return {key: BINARY_DTYPES.get(key, '<f4') for key in arrays}
+
+
+def path(level: Level, group) -> str:
+    return f'{level.name}.{group}.bin'
+
+
+def manifest(pyramid: Pyramid) -> dict:
+    return {'version': LOD_VERSION, 'levels': [{'name': level.name, 'bucket_ms': level.bucket_ms, 'count': len(pyramid.levels[level.name]['start']),
+             'retain': level.retain, 'paths': {group: path(level, group) for group in FILES}} for level in LEVELS]}
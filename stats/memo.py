@@ -0,0 +1,47 @@
+import collections
+import os
+import pickle
+from typing import Callable, Generic, Optional, TypeVar
+
+from stats.pack import PackStore
+
+T = TypeVar('T')
+
+
+class ConversionMemo(Generic[T]):
+    """Results of a pure conversion keyed by the blob id of its input and the converter version.
+
+    The newest `size` results are kept in memory, the newest `disk_size` in a pack file under `root`.
+    Every scrape brings a new payload, so only the newest few are ever asked for again.
+    Results are handed out shared, callers must not modify them."""
+
+    def __init__(self, root, version, size=16, disk_size=2):
+        self.pack = PackStore(os.path.join(root, f'v{version}', 'converted.pack'))
+        self.lru: collections.OrderedDict = collections.OrderedDict()
+        self.size = size
+        self.disk_size = disk_size
+
+    def get(self, blob, convert: Callable[[], Optional[T]]) -> Optional[T]:
+        if blob in self.lru:
+            self.lru.move_to_end(blob)
+            return self.lru[blob]
+        data = self.pack.get(blob)
+        if data is not None:
+            result = pickle.loads(data)
+        else:
+            result = convert()
+            if result is None:
+                return None
+            self.pack.put(blob, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        self.lru[blob] = result
+        if len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+        return result
+
+    def trim(self):
+        """Drops all but the newest `disk_size` results from disk, once there are twice as many."""
+        if len(self.pack) > 2 * self.disk_size:
+            self.pack.compact(list(self.pack.entries)[-self.disk_size:])
+
+    def close(self):
+        self.pack.close()
@@ -0,0 +1,86 @@
+import gc
+import sys
+import tracemalloc
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+
+def model_name(cls) -> str:
+    """v1.Planet, frontend.Planet, ..."""
+    return f"{cls.__module__.rsplit('.', 1)[-1]}.{cls.__qualname__}"
+
+
+def shallow_size(model: BaseModel) -> int:
+    """Bytes held by the model itself and its field values, not counting nested models or the items of containers."""
+    size = sys.getsizeof(model) + sys.getsizeof(model.__dict__) + sys.getsizeof(model.__pydantic_fields_set__)
+    for value in model.__dict__.values():
+        if not isinstance(value, BaseModel):
+            size += sys.getsizeof(value)
+    return size
+
+
+def model_census() -> Dict[str, Dict[str, int]]:
+    """Live pydantic models by type, with their count and shallow bytes."""
+    census: Dict[str, Dict[str, int]] = {}
+    for obj in gc.get_objects():
+        if isinstance(obj, BaseModel):
+            entry = census.setdefault(model_name(type(obj)), {'count': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['bytes'] += shallow_size(obj)
+    return census
+
+
+class MemoryAccounting:
+    """Peak and retained traced bytes per span, and the pydantic models alive when spans end or samples are taken.
+
+    Slows the build down a lot, so it is only turned on when asked for. Allocations in worker processes are not seen."""
+
+    def __init__(self, sample_every=50):
+        self.sample_every = sample_every
+        self.calls = 0
+        self.running_peaks: List[int] = []
+        self.peak_bytes = 0
+        self.peak_models: Dict[str, Dict[str, int]] = {}
+        tracemalloc.start()
+
+    def enter(self, span):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak_bytes = max(self.peak_bytes, peak)
+        if self.running_peaks:
+            self.running_peaks[-1] = max(self.running_peaks[-1], peak)
+        tracemalloc.reset_peak()
+        self.running_peaks.append(current)
+        span.memory = {'start_bytes': current}
+
+    def exit(self, span):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak_bytes = max(self.peak_bytes, peak)
+        peak = max(self.running_peaks.pop(), peak)
+        if self.running_peaks:
+            self.running_peaks[-1] = max(self.running_peaks[-1], peak)
+        start = span.memory['start_bytes']
+        span.memory.update(peak_bytes=peak, peak_growth_bytes=peak - start, retained_bytes=current - start, models=self._census())
+        snapshots = span.counters.get('snapshots')
+        if snapshots:
+            span.memory['peak_growth_bytes_per_snapshot'] = (peak - start) // snapshots
+            span.memory['retained_bytes_per_snapshot'] = (current - start) // snapshots
+
+    def sample(self):
+        """Takes a model census every `sample_every` calls, cheap enough to call once per snapshot."""
+        self.calls += 1
+        if self.calls % self.sample_every == 0:
+            self._census()
+
+    def _census(self):
+        census = model_census()
+        for name, entry in census.items():
+            peak = self.peak_models.setdefault(name, {'count': 0, 'bytes': 0})
+            peak['count'] = max(peak['count'], entry['count'])
+            peak['bytes'] = max(peak['bytes'], entry['bytes'])
+        return census
+
+    def report(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {'current_bytes': current, 'peak_bytes': max(self.peak_bytes, peak),
+                'peak_models': dict(sorted(self.peak_models.items(), key=lambda x: x[1]['bytes'], reverse=True))}
@@ -0,0 +1,37 @@
+from typing import Callable, Dict
+
+Migration = Callable[[dict], dict]
+
+
+class Rederive(Exception):
+    """Raised by a migration that cannot upgrade a record without the payload it was parsed from."""
+
+
+class MigrationRegistry:
+    """Steps that upgrade a cached record, as the dict it was dumped from, from one schema version to the next.
+
+    A step may change the dict in place or return a new one. Versions without a registered step have to be re-derived."""
+
+    def __init__(self):
+        self.steps: Dict[int, Migration] = {}
+
+    def register(self, from_version):
+        def decorator(step: Migration) -> Migration:
+            if from_version in self.steps:
+                raise ValueError(f"Migration from version {from_version} is already registered")
+            self.steps[from_version] = step
+            return step
+        return decorator
+
+    def upgrade(self, record: dict, version) -> dict:
+        current = record.get('version') or 0
+        if current > version:
+            raise Rederive(f"record is from a newer version {current}")
+        while current < version:
+            step = self.steps.get(current)
+            if step is None:
+                raise Rederive(f"no migration from version {current}")
+            record = step(record)
+            current += 1
+            record['version'] = current
+        return record
@@ -0,0 +1,132 @@
+import mmap
+import os
+import struct
+import zlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+MAGIC = b'HDSP'
+# magic, blob id, payload length, payload crc32
+ENTRY_HEADER = struct.Struct('<4s20sII')
+# blob id, entry offset, payload length, payload crc32
+INDEX_ENTRY = struct.Struct('<20sQII')
+
+
+class PackEntry(NamedTuple):
+    offset: int
+    length: int
+    crc: int
+
+
+class PackStore:
+    """Append-only store of blobs in one data file with a fixed width offset index next to it.
+
+    Reads go through a memory map of the data file, so fetching an entry is a dictionary lookup and a slice."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.entries: Dict[str, PackEntry] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._fh = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as fh:
+                raw = fh.read()
+            # A torn final write leaves a partial entry behind, ignore it
+            usable = len(raw) - (len(raw) % INDEX_ENTRY.size)
+            for (blob, offset, length, crc) in INDEX_ENTRY.iter_unpack(raw[:usable]):
+                self.entries[blob.hex()] = PackEntry(offset, length, crc)
+
+    def __contains__(self, blob):
+        return blob in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _view(self):
+        if self._map is None:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                return None
+            self._fh = open(self.path, 'rb')
+            self._map = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get(self, blob) -> Optional[bytes]:
+        entry = self.entries.get(blob)
+        if entry is None:
+            return None
+        view = self._view()
+        start = entry.offset + ENTRY_HEADER.size
+        data = view[start:start + entry.length]
+        if len(data) != entry.length or zlib.crc32(data) != entry.crc:
+            print(f"Corrupt pack entry for {blob}")
+            return None
+        return data
+
+    def put(self, blob, data: bytes):
+        self.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        crc = zlib.crc32(data)
+        with open(self.path, 'ab') as fh:
+            offset = fh.tell()
+            fh.write(ENTRY_HEADER.pack(MAGIC, bytes.fromhex(blob), len(data), crc))
+            fh.write(data)
+        # Only index the entry once the data is on disk
+        with open(self.index_path, 'ab') as fh:
+            fh.write(INDEX_ENTRY.pack(bytes.fromhex(blob), offset, len(data), crc))
+        self.entries[blob] = PackEntry(offset, len(data), crc)
+
+    def verify(self) -> List[str]:
+        """Checks every indexed entry against its header and checksum, returns a description of each problem."""
+        problems = []
+        view = self._view()
+        size = 0 if view is None else len(view)
+        for blob, entry in self.entries.items():
+            if entry.offset + ENTRY_HEADER.size + entry.length > size:
+                problems.append(f"{blob}: entry runs past the end of the pack")
+                continue
+            magic, raw_blob, length, crc = ENTRY_HEADER.unpack_from(view, entry.offset)
+            if magic != MAGIC or raw_blob.hex() != blob or length != entry.length or crc != entry.crc:
+                problems.append(f"{blob}: header does not match the index")
+                continue
+            start = entry.offset + ENTRY_HEADER.size
+            if zlib.crc32(view[start:start + length]) != crc:
+                problems.append(f"{blob}: checksum mismatch")
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) % INDEX_ENTRY.size:
+            problems.append("index ends with a partial entry")
+        return problems
+
+    def compact(self, keep: Iterable[str]):
+        """Rewrites the pack with only the readable entries for `keep`, dropping superseded and corrupt data."""
+        keep = set(keep)
+        self.rewrite(lambda blob, data: data if blob in keep else None)
+
+    def rewrite(self, transform: Callable[[str, bytes], Optional[bytes]]):
+        """Rewrites the pack with every readable entry replaced by `transform(blob, data)`, or dropped when that is None."""
+        tmp = PackStore(self.path + '.tmp')
+        for path in (tmp.path, tmp.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+        for blob in self.entries:
+            data = self.get(blob)
+            if data is None:
+                continue
+            data = transform(blob, data)
+            if data is not None:
+                tmp.put(blob, data)
+        self.close()
+        tmp.close()
+        if os.path.exists(tmp.path):
+            os.replace(tmp.path, self.path)
+            os.replace(tmp.index_path, self.index_path)
+        else:
+            for path in (self.path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.entries = tmp.entries
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._fh.close()
+            self._map = None
+            self._fh = None
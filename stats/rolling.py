@@ -0,0 +1,235 @@
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+
+from stats.columns import PlanetColumns
+
+ROLLING_VERSION = 1
+HOUR_MS = 60 * 60 * 1000
+
+
+class Window(NamedTuple):
+    name: str
+    snapshots: int
+
+
+WINDOWS = [
+    Window('1h', 6),
+    Window('6h', 6 * 6),
+    Window('1d', 6 * 24),
+]
+# Liberation velocity is in percent per hour
+METRICS = ['players', 'liberation', 'velocity']
+TOP_K = 10
+# Welford state per planet, and its value before any snapshot
+EMPTY = {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.nan, 'max': np.nan}
+
+Stats = Dict[str, Dict[str, np.ndarray]]
+SCORES: Dict[str, Callable[[Stats], np.ndarray]] = {}
+
+
+def score(name):
+    """Registers a ranking score, a function from the window stats of every metric to one value per planet."""
+    def decorator(fn):
+        if name in SCORES:
+            raise ValueError(f"Score {name} is already registered")
+        SCORES[name] = fn
+        return fn
+    return decorator
+
+
+@score('players')
+def _players(stats: Stats):
+    return stats['players']['mean']
+
+
+@score('liberation_variance')
+def _liberation_variance(stats: Stats):
+    return stats['liberation']['variance']
+
+
+@score('liberation_range')
+def _liberation_range(stats: Stats):
+    return stats['liberation']['max'] - stats['liberation']['min']
+
+
+@score('liberation_velocity')
+def _liberation_velocity(stats: Stats):
+    return np.abs(stats['velocity']['mean'])
+
+
+def snapshot_values(columns: PlanetColumns, row, last) -> Dict[str, np.ndarray]:
+    """Metrics of one snapshot, NaN where a planet is missing. Velocity is NaN where the owner or event changed."""
+    present = columns.present[row]
+    progress = columns.progress(row)
+    hours = (columns.timestamp[row] - last['timestamp']) / HOUR_MS
+    with np.errstate(invalid='ignore', divide='ignore'):
+        velocity = (progress - last['liberation']) / hours
+    same = (columns.owner[row] == last['owner']) & (columns.event[row] == last['event'])
+    return {
+        'players': np.where(present, columns.players[row], np.nan),
+        'liberation': progress,
+        'velocity': np.where(same & (hours > 0), velocity, np.nan),
+    }
+
+
+class RollingStats:
+    """Mean, variance, min and max per planet of every metric over the last snapshots of every window in `WINDOWS`.
+
+    A ring of the newest snapshots gives the value leaving each window, so a new snapshot is added and the oldest
+    removed in one vectorized step. Means and variances are updated with Welford's method and recomputed from the ring
+    every time it wraps, so rounding errors do not pile up. Min and max are only rescanned for planets whose min or
+    max just left the window."""
+
+    def __init__(self):
+        self.capacity = max(window.snapshots for window in WINDOWS)
+        self.head = 0
+        self.filled = 0
+        self.last_timestamp = np.int64(-1)
+        self.ring = {metric: np.full((self.capacity, 0), np.nan) for metric in METRICS}
+        self.last = {'liberation': np.zeros(0), 'owner': np.zeros(0, dtype=np.int64), 'event': np.zeros(0, dtype=np.int64)}
+        self.stats = {window.name: {metric: {key: np.zeros(0, dtype=np.int64 if key == 'count' else np.float64) for key in EMPTY}
+                                    for metric in METRICS} for window in WINDOWS}
+
+    def _resize(self, width):
+        def grow(values, fill):
+            grown = np.full(values.shape[:-1] + (width,), fill, dtype=values.dtype)
+            grown[..., :values.shape[-1]] = values
+            return grown
+
+        self.ring = {metric: grow(values, np.nan) for metric, values in self.ring.items()}
+        self.last = {'liberation': grow(self.last['liberation'], np.nan), 'owner': grow(self.last['owner'], -1), 'event': grow(self.last['event'], -1)}
+        for window in self.stats.values():
+            for stats in window.values():
+                for key, values in stats.items():
+                    stats[key] = grow(values, EMPTY[key])
+
+    @property
+    def width(self):
+        return self.ring['players'].shape[1]
+
+    def update(self, columns: PlanetColumns, rows):
+        """Adds `rows` of `columns` (snapshots not seen before) in time order, skipping any older than the newest seen."""
+        rows = columns.ordered(rows, after=self.last_timestamp)
+        if columns.planet_count > self.width:
+            self._resize(columns.planet_count)
+        pad = self.width - columns.planet_count
+        for row in rows:
+            last = {key: values[:columns.planet_count] for key, values in self.last.items()}
+            values = snapshot_values(columns, row, dict(last, timestamp=self.last_timestamp))
+            self._push({metric: np.pad(v, (0, pad), constant_values=np.nan) for metric, v in values.items()})
+            last['liberation'][:] = values['liberation']
+            last['owner'][:] = columns.owner[row]
+            last['event'][:] = columns.event[row]
+            self.last_timestamp = columns.timestamp[row]
+
+    def _window_rows(self, snapshots):
+        return (self.head - 1 - np.arange(min(snapshots, self.filled))) % self.capacity
+
+    def _push(self, values: Dict[str, np.ndarray]):
+        evicted = {}
+        for window in WINDOWS:
+            if self.filled >= window.snapshots:
+                evicted[window.name] = {metric: self.ring[metric][(self.head - window.snapshots) % self.capacity].copy() for metric in METRICS}
+        for metric in METRICS:
+            self.ring[metric][self.head] = values[metric]
+        self.head = (self.head + 1) % self.capacity
+        self.filled = min(self.filled + 1, self.capacity)
+
+        for window in WINDOWS:
+            for metric in METRICS:
+                stats = self.stats[window.name][metric]
+                old = evicted.get(window.name, {}).get(metric)
+                if old is not None:
+                    _remove(stats, old)
+                _add(stats, values[metric])
+                stats['min'] = np.fmin(stats['min'], values[metric])
+                stats['max'] = np.fmax(stats['max'], values[metric])
+                if old is not None:
+                    stale = (old == stats['min']) | (old == stats['max'])
+                    if stale.any():
+                        window_values = self.ring[metric][self._window_rows(window.snapshots)][:, stale]
+                        stats['min'][stale] = np.fmin.reduce(window_values, axis=0)
+                        stats['max'][stale] = np.fmax.reduce(window_values, axis=0)
+        if self.head == 0:
+            self._rebase()
+
+    def _rebase(self):
+        for window in WINDOWS:
+            rows = self._window_rows(window.snapshots)
+            for metric in METRICS:
+                values = self.ring[metric][rows]
+                stats = self.stats[window.name][metric]
+                count = np.sum(~np.isnan(values), axis=0)
+                mean = np.divide(np.nansum(values, axis=0), count, out=np.zeros(self.width), where=count > 0)
+                stats['count'] = count
+                stats['mean'] = mean
+                stats['m2'] = np.nansum((values - mean) ** 2, axis=0)
+
+    def window_stats(self, name) -> Stats:
+        """Count, mean, variance, min and max per planet of every metric, NaN where a planet has no values."""
+        out = {}
+        for metric, stats in self.stats[name].items():
+            count = stats['count']
+            has = count > 0
+            out[metric] = {
+                'count': count,
+                'mean': np.where(has, stats['mean'], np.nan),
+                'variance': np.where(has, np.maximum(stats['m2'], 0.0) / np.maximum(count, 1), np.nan),
+                'min': np.where(has, stats['min'], np.nan),
+                'max': np.where(has, stats['max'], np.nan),
+            }
+        return out
+
+    def rankings(self, name, planets, k=TOP_K) -> Dict[str, List[list]]:
+        """The `k` best of `planets` by every registered score over window `name`, as [planet, score] pairs."""
+        stats = self.window_stats(name)
+        planets = [planet for planet in planets if planet < self.width]
+        out = {}
+        for score_name, fn in SCORES.items():
+            scores = fn(stats)
+            ranked = sorted((planet for planet in planets if np.isfinite(scores[planet])), key=lambda planet: scores[planet], reverse=True)
+            out[score_name] = [[planet, round(float(scores[planet]), 6)] for planet in ranked[:k]]
+        return out
+
+    def to_json(self, planets) -> dict:
+        return {'version': ROLLING_VERSION, 'windows': [{'name': window.name, 'snapshots': window.snapshots,
+                                                         'rankings': self.rankings(window.name, planets)} for window in WINDOWS]}
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {f'rolling.ring.{metric}': values for metric, values in self.ring.items()}
+        arrays.update({f'rolling.last.{key}': values for key, values in self.last.items()})
+        arrays.update({f'rolling.{window}.{metric}.{key}': values for window, metrics in self.stats.items()
+                       for metric, stats in metrics.items() for key, values in stats.items()})
+        arrays['rolling.position'] = np.array([self.head, self.filled, self.last_timestamp], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'RollingStats':
+        rolling = cls()
+        rolling.ring = {metric: arrays[f'rolling.ring.{metric}'] for metric in METRICS}
+        rolling.last = {key: arrays[f'rolling.last.{key}'] for key in rolling.last}
+        for window, metrics in rolling.stats.items():
+            for metric, stats in metrics.items():
+                for key in stats:
+                    stats[key] = arrays[f'rolling.{window}.{metric}.{key}']
+        rolling.head, rolling.filled, rolling.last_timestamp = arrays['rolling.position'].tolist()
+        return rolling
+
+
+def _add(stats, values):
+    has = ~np.isnan(values)
+    count = stats['count'] + has
+    delta = np.where(has, values - stats['mean'], 0.0)
+    mean = stats['mean'] + delta / np.maximum(count, 1)
+    stats['m2'] = stats['m2'] + np.where(has, delta * (values - mean), 0.0)
+    stats['count'], stats['mean'] = count, mean
+
+
+def _remove(stats, values):
+    has = ~np.isnan(values)
+    count = stats['count'] - has
+    delta = np.where(has, values - stats['mean'], 0.0)
+    mean = np.where(count > 0, stats['mean'] - delta / np.maximum(count, 1), 0.0)
+    stats['m2'] = np.where(count > 0, stats['m2'] - np.where(has, delta * (values - mean), 0.0), 0.0)
+    stats['count'], stats['mean'] = count, mean
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+SHARDS_VERSION = 1
+BUCKET_MS = 24 * 60 * 60 * 1000
+MANIFEST = 'manifest.json'
+
+
+def planet_shards(arrays) -> Iterator[Tuple[int, int, dict]]:
+    """(planet, bucket start, shard) for every planet and day with snapshots that show the planet.
+
+    `arrays` is the output of `stats.columnar.aggregate_arrays`, shards hold the same values as aggregates.json."""
+    timestamps = arrays['timestamp']
+    buckets = timestamps // BUCKET_MS * BUCKET_MS
+    for planet, shown, players, liberation in zip(arrays['planets'].tolist(), arrays['shown'], arrays['attack_players'], arrays['attack_liberation']):
+        rows = np.flatnonzero(shown)
+        if len(rows) == 0:
+            continue
+        starts, firsts = np.unique(buckets[rows], return_index=True)
+        for start, chunk in zip(starts.tolist(), np.split(rows, firsts[1:])):
+            yield planet, start, {
+                'planet': planet,
+                'start': start,
+                'timestamp': timestamps[chunk].tolist(),
+                'players': players[chunk].tolist(),
+                'liberation': liberation[chunk].tolist(),
+            }
+
+
+def write_shards(root, arrays):
+    """Writes one file per planet and day under `root` with a manifest listing them.
+
+    File names include a hash of their contents, so a shard that did not change keeps its name and is not rewritten,
+    and clients can cache shards forever. Shards no longer listed are removed."""
+    manifest: Dict[str, list] = {}
+    keep = {MANIFEST}
+    for planet, start, shard in planet_shards(arrays):
+        data = json.dumps(shard).encode()
+        path = f'{planet}/{start // BUCKET_MS}-{hashlib.sha1(data).hexdigest()[:12]}.json'
+        full_path = os.path.join(root, path)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as fh:
+                fh.write(data)
+        keep.add(path)
+        manifest.setdefault(str(planet), []).append({'start': start, 'count': len(shard['timestamp']), 'path': path})
+
+    os.makedirs(root, exist_ok=True)
+    tmp_path = os.path.join(root, MANIFEST + '.tmp')
+    with open(tmp_path, 'w') as fh:
+        fh.write(json.dumps({'version': SHARDS_VERSION, 'bucket_ms': BUCKET_MS, 'planets': manifest}))
+    os.replace(tmp_path, os.path.join(root, MANIFEST))
+
+    for directory, _, files in os.walk(root, topdown=False):
+        for name in files:
+            if os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/') not in keep:
+                os.remove(os.path.join(directory, name))
+        if directory != root and not os.listdir(directory):
+            os.rmdir(directory)
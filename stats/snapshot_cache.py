@@ -0,0 +1,157 @@
+import datetime
+import json
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional, TypeVar
+
+from stats.gitobjects import SnapshotRef
+from stats.migrations import MigrationRegistry, Rederive
+from stats.pack import PackStore
+
+T = TypeVar('T')
+
+
+class Rejection(NamedTuple):
+    """Why a snapshot payload cannot be used, and the schema version that decided it."""
+    # 'api-error' when the API answered with an error, 'invalid' when the payload does not validate
+    reason: str
+    version: int
+
+
+class SnapshotCache:
+    """Parsed snapshots keyed by the git blob id of the snapshot file, plus a commit -> (blob, commit time) map.
+
+    Commits that share a payload share a cache entry, and entries survive history being rewritten.
+    The entries themselves live in a single memory mapped pack file.
+    Payloads that cannot be used are remembered as rejections, so they are not read from git again."""
+
+    def __init__(self, root):
+        self.root = root
+        self.commits_path = os.path.join(root, 'commits.json')
+        self.rejected_path = os.path.join(root, 'rejected.json')
+        self.schema_path = os.path.join(root, 'schema.json')
+        self.pack = PackStore(os.path.join(root, 'snapshots.pack'))
+        self.commits: Dict[str, List] = self._load(self.commits_path, "commit map")
+        self.rejected: Dict[str, Rejection] = {blob: Rejection(*entry) for blob, entry in self._load(self.rejected_path, "rejection list").items()}
+        self.dirty = False
+
+    @staticmethod
+    def _load(path, what) -> dict:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as fh:
+            try:
+                return json.load(fh)
+            except json.JSONDecodeError as exc:
+                print(f"Bad {what} {exc}")
+                return {}
+
+    def blob_for(self, commit) -> Optional[str]:
+        known = self.commits.get(commit)
+        return None if known is None else known[0]
+
+    def remember(self, snapshot: SnapshotRef, blob):
+        known = [blob, int(snapshot.snapshot_at.timestamp())]
+        if self.commits.get(snapshot.commit) != known:
+            self.commits[snapshot.commit] = known
+            self.dirty = True
+
+    def rejection(self, blob) -> Optional[Rejection]:
+        return self.rejected.get(blob)
+
+    def reject(self, snapshot: SnapshotRef, blob, rejection: Rejection):
+        if self.rejected.get(blob) != rejection:
+            self.rejected[blob] = rejection
+            self.dirty = True
+        self.remember(snapshot, blob)
+
+    def snapshots(self, start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> List[SnapshotRef]:
+        """Every remembered snapshot with start <= snapshot_at < end, oldest first. Needs no git access."""
+        out = []
+        for commit, (blob, timestamp) in self.commits.items():
+            snapshot_at = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+            if start is not None and snapshot_at < start:
+                continue
+            if end is not None and snapshot_at >= end:
+                continue
+            out.append(SnapshotRef(commit, snapshot_at, blob))
+        out.sort(key=lambda s: s.snapshot_at)
+        return out
+
+    def get(self, blob, validate: Callable[[bytes], T]) -> Optional[T]:
+        data = self.pack.get(blob)
+        if data is None:
+            return None
+        return validate(data)
+
+    def put(self, blob, data: str):
+        self.pack.put(blob, data.encode())
+
+    def migrate(self, migrations: MigrationRegistry, version):
+        """Upgrades every entry to schema `version`, dropping entries that have to be re-derived from git.
+
+        Only runs when the version recorded for the pack changes."""
+        if self._load(self.schema_path, "schema version").get('version') == version:
+            return
+        upgraded = dropped = 0
+
+        def upgrade(blob, data):
+            nonlocal upgraded, dropped
+            record = json.loads(data)
+            if record.get('version') == version:
+                return data
+            try:
+                record = migrations.upgrade(record, version)
+            except Rederive:
+                dropped += 1
+                return None
+            upgraded += 1
+            return json.dumps(record).encode()
+
+        if len(self.pack):
+            self.pack.rewrite(upgrade)
+        if dropped:
+            self.commits = {commit: known for commit, known in self.commits.items() if known[0] in self.pack or known[0] in self.rejected}
+            self.dirty = True
+        if upgraded or dropped:
+            print(f"Migrated {upgraded} cached snapshots to version {version}, {dropped} will be re-read")
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.schema_path, 'w') as fh:
+            json.dump({'version': version}, fh)
+
+    def verify(self) -> List[str]:
+        problems = self.pack.verify()
+        for commit, (blob, _) in self.commits.items():
+            if blob is not None and blob not in self.pack and blob not in self.rejected:
+                problems.append(f"{commit}: snapshot {blob} is not in the pack")
+        return problems
+
+    def compact(self, limit):
+        """Forgets all but the newest `limit` commits and drops pack entries nothing refers to anymore."""
+        newest = self.snapshots()[-limit:]
+        self.pack.compact(s.blob for s in newest)
+        # Corrupt entries are dropped by the pack, the next build re-reads them from git
+        self.commits = {s.commit: [s.blob, int(s.snapshot_at.timestamp())] for s in newest if s.blob in self.pack or s.blob in self.rejected}
+        self.rejected = {s.blob: self.rejected[s.blob] for s in newest if s.blob in self.rejected}
+        self.dirty = True
+        self.save()
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        for path, value in ((self.commits_path, self.commits), (self.rejected_path, self.rejected)):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as fh:
+                json.dump(value, fh)
+            os.replace(tmp_path, path)
+        self.dirty = False
+
+    def close(self):
+        self.save()
+        self.pack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,110 @@
+import contextlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from .memory import MemoryAccounting
+
+
+class Span:
+    def __init__(self, name, depth, start_ns):
+        self.name = name
+        self.depth = depth
+        self.start_ns = start_ns
+        self.end_ns: Optional[int] = None
+        self.counters: Dict[str, int] = {}
+        # Filled in by MemoryAccounting when it is on
+        self.memory: Optional[dict] = None
+
+    def add(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Tracer:
+    """Nested timed spans with counters, cheap enough to leave on for every build.
+
+    Counters added outside any span are kept on the tracer itself."""
+
+    def __init__(self):
+        self.origin_ns = time.perf_counter_ns()
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+        self.counters: Dict[str, int] = {}
+        self.memory: Optional[MemoryAccounting] = None
+
+    def enable_memory(self, sample_every=50):
+        """Adds traced memory and live pydantic models to every span started from now on."""
+        self.memory = MemoryAccounting(sample_every)
+
+    @contextlib.contextmanager
+    def span(self, name, **counters):
+        span = Span(name, len(self.stack), time.perf_counter_ns())
+        for counter, value in counters.items():
+            span.add(counter, value)
+        self.spans.append(span)
+        if self.memory is not None:
+            self.memory.enter(span)
+        self.stack.append(span)
+        try:
+            yield span
+        finally:
+            self.stack.pop()
+            if self.memory is not None and span.memory is not None:
+                self.memory.exit(span)
+            span.end_ns = time.perf_counter_ns()
+
+    def add(self, counter, value=1):
+        """Adds to `counter` on the innermost open span."""
+        if self.stack:
+            self.stack[-1].add(counter, value)
+        else:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def sample(self):
+        if self.memory is not None:
+            self.memory.sample()
+
+    def report(self) -> dict:
+        finished = [span for span in self.spans if span.end_ns is not None]
+        report = {
+            'started_at': self.started_at,
+            'total_ms': (time.perf_counter_ns() - self.origin_ns) / 1e6,
+            'counters': self.counters,
+            'spans': [{'name': span.name, 'depth': span.depth, 'start_ms': (span.start_ns - self.origin_ns) / 1e6,
+                       'duration_ms': span.duration_ms, **span.counters, **(span.memory or {})} for span in finished],
+        }
+        if self.memory is not None:
+            report['memory'] = self.memory.report()
+        return report
+
+    def write_report(self, path):
+        _write_json(path, self.report())
+
+    def write_trace_events(self, path):
+        """Writes the spans in the Chrome trace event format, for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        events = [{'name': span.name, 'ph': 'X', 'pid': pid, 'tid': 0, 'ts': (span.start_ns - self.origin_ns) / 1e3,
+                   'dur': (span.end_ns - span.start_ns) / 1e3, 'args': {**span.counters, **(span.memory or {})}}
+                  for span in self.spans if span.end_ns is not None]
+        _write_json(path, {'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+
+def _write_json(path, value):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(value, fh, indent=1)
+
+
+# The tracer of this build
+TRACER = Tracer()
+span = TRACER.span
+add = TRACER.add
+sample = TRACER.sample
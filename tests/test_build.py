@@ -0,0 +1,123 @@
+"""Runs build_stats.py on a synthetic history from bench/synthetic.py.
+
+    python -m pytest tests
+
+Incremental builds must write what a --full build writes, and aggregates.json, recent_attacks.json and
+current_status.json must stay byte-identical to what the per-step loops the aggregation engine replaced wrote.
+"""
+
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from build_stats import HISTORY_LENGTH, RECENCY, v1_to_frontend
+from models import v1
+
+COMMITS = 40
+# Incremental builds run at each of these, several new commits at a time, then one
+REVISIONS = ['master~30', 'master~12', 'master~11', 'master']
+
+
+def clone(history, dest):
+    subprocess.run(['git', 'clone', '-q', str(history), str(dest)], check=True)
+    os.makedirs(os.path.join(dest, 'docs', 'data'))
+    return dest
+
+
+def build(repo, *args):
+    subprocess.run([sys.executable, os.path.join(ROOT, 'build_stats.py'), *args], cwd=repo, check=True, stdout=subprocess.DEVNULL)
+
+
+def outputs(repo):
+    """Every file written to docs/data by relative path, but the timings in build_report.json."""
+    root = os.path.join(repo, 'docs', 'data')
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as fh:
+                files[os.path.relpath(path, root)] = fh.read()
+    del files['build_report.json']
+    return files
+
+
+def baseline(repo):
+    """The outputs as create_agg_stats wrote them before the aggregation engine, one record at a time."""
+    log = subprocess.check_output(['git', 'log', '--format=%H %ct', '--', '801_full_v1.json'], cwd=repo, text=True)
+    records = []
+    for line in log.splitlines()[:HISTORY_LENGTH]:
+        commit, committed = line.split()
+        data = subprocess.check_output(['git', 'show', f'{commit}:801_full_v1.json'], cwd=repo)
+        try:
+            record = v1.FullStatus.model_validate_json(data)
+        except ValidationError:
+            # The API errors in the history
+            continue
+        record.snapshot_at = datetime.datetime.fromtimestamp(int(committed), datetime.timezone.utc)
+        records.append(v1_to_frontend(record))
+    records.sort(key=lambda row: row.snapshot_at)
+
+    players = [0]*len(records)
+    active = set([campaign.planet.index for campaign in records[-1].active])
+    active_sum = {p: 0 for p in active}
+    active_planet_hist = []
+    recent_start = len(records) - RECENCY
+    for (step, record) in enumerate(records):
+        active_step = {}
+        for status in record.planets.values():
+            players[step] += status.statistics.player_count
+            if status.index in active:
+                active_step[status.index] = {'players': status.statistics.player_count, 'liberation': status.liberation}
+                if step > recent_start:
+                    active_sum[status.index] += status.statistics.player_count
+        for event in record.events:
+            planet = record.planets[event.planet.index]
+            active_step[event.planet.index] = {'players': planet.statistics.player_count, 'liberation': event.liberation}
+        active_planet_hist.append(active_step)
+    most_active = sorted(active_sum.items(), key=lambda x: x[1], reverse=True)
+
+    rows = [{'timestamp': record.snapshot_at, 'players': count, 'impact': record.war.impact_multiplier, 'attacks': attacks}
+            for record, count, attacks in zip(records, players, active_planet_hist)]
+    return {
+        'aggregates.json': json.dumps(rows).encode(),
+        'recent_attacks.json': json.dumps(most_active).encode(),
+        'current_status.json': records[-1].model_dump_json().encode(),
+    }
+
+
+@pytest.fixture(scope='module')
+def history(tmp_path_factory):
+    path = tmp_path_factory.mktemp('synthetic') / 'history'
+    subprocess.run([sys.executable, os.path.join(ROOT, 'bench', 'synthetic.py'), str(path), '--commits', str(COMMITS), '--seed', '1'],
+                   check=True, stdout=subprocess.DEVNULL)
+    return path
+
+
+@pytest.fixture(scope='module')
+def full_build(history, tmp_path_factory):
+    repo = clone(history, tmp_path_factory.mktemp('full') / 'repo')
+    build(repo, '--full')
+    return outputs(repo)
+
+
+def test_incremental_matches_full(history, full_build, tmp_path):
+    repo = clone(history, tmp_path / 'repo')
+    for revision in REVISIONS:
+        subprocess.run(['git', 'checkout', '-q', revision], cwd=repo, check=True)
+        build(repo)
+    incremental = outputs(repo)
+    assert sorted(incremental) == sorted(full_build)
+    assert [name for name in full_build if incremental[name] != full_build[name]] == []
+
+
+def test_matches_baseline(history, full_build):
+    expected = baseline(history)
+    assert [name for name in expected if full_build[name] != expected[name]] == []